@@ -0,0 +1,86 @@
+# benchmarks/dupe_ngrams.py
+
+import argparse
+import random
+import timeit
+from collections import Counter
+
+from halvesting.utils.data.postprocessing import Postprocessing
+
+_NS = range(5, 11)
+_WORDS = (
+    "the model results données étude analyse of and we propose méthode réseau "
+    "neural network training 0.00 table figure section dans les pour une with on"
+).split()
+
+
+def counter_dupe_ngrams(document: Postprocessing, n: int):
+    """Counter based implementation used before the n-gram identifiers."""
+    if document.num_normalized_words < n:
+        return 0.0
+    content = document.normalized_content
+    ngrams = [content[i : i + n] for i in range(len(content) - n + 1)]
+    ngrams_count = Counter(ngrams)
+    dedup_size = sum(count for count in ngrams_count.values() if count > 1)
+    return round(dedup_size / len(ngrams), 2)
+
+
+def synthetic_paper(num_chars: int, seed: int = 0):
+    """Builds a paper-like text of about ``num_chars`` characters, with lines
+    of random words and some repeated paragraphs."""
+    rng = random.Random(seed)
+    lines = []
+    size = 0
+    while size < num_chars:
+        if lines and rng.random() < 0.1:
+            line = rng.choice(lines)
+        else:
+            line = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(5, 20)))
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the duplicate character n-gram fractions."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[20_000, 100_000, 400_000],
+        help="Number of characters of each synthetic paper.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Number of timed runs per size."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"{'chars':>10} {'counter (s)':>12} {'multi (s)':>12} {'speedup':>8}")
+    for num_chars in args.sizes:
+        document = Postprocessing(text=synthetic_paper(num_chars), lang="en")
+        # Normalizes the text once, outside of the timed runs
+        expected = {n: counter_dupe_ngrams(document, n) for n in _NS}
+        assert document.rps_frac_chars_in_dupe_ngrams_multi(_NS) == expected
+        counter_time = min(
+            timeit.repeat(
+                lambda: [counter_dupe_ngrams(document, n) for n in _NS],
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        multi_time = min(
+            timeit.repeat(
+                lambda: document.rps_frac_chars_in_dupe_ngrams_multi(_NS),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print(
+            f"{num_chars:>10} {counter_time:>12.3f} {multi_time:>12.3f} "
+            f"{counter_time / multi_time:>7.1f}x"
+        )
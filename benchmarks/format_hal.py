@@ -0,0 +1,149 @@
+# benchmarks/format_hal.py
+
+import argparse
+import os
+import re
+import timeit
+from datetime import datetime
+
+import lxml.html
+
+from halvesting.utils.data.preprocessing import (HALStreamParser, extract_year,
+                                                  format_hal)
+
+_FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "hal_page.xml")
+_CHUNK_SIZE = 2**16
+
+
+def xpath_parse_authors(authors):
+    """Per-record XPath implementation used before the precompiled expressions."""
+    authors_list = []
+    for author in authors:
+        author_ = {}
+        author_["affiliations"] = []
+        for name in author.xpath(".//persname"):
+            author_["name"] = re.sub(r" +", r" ", "".join(name.itertext()).strip())
+        for e in author.xpath(".//idno | .//affiliation | .//email"):
+            attrib = e.attrib
+            text = e.text
+            if "type" in attrib:
+                if attrib["type"] == "domain" or attrib["type"] == "idhal":
+                    continue
+                elif attrib["type"] == "md5":
+                    author_[attrib["type"].lower()] = text
+                elif attrib["type"] == "halauthorid":
+                    author_["halauthorid"] = re.sub(r"(^.+)-(.+$)", r"\2", text)
+                else:
+                    author_[attrib["type"].lower()] = re.sub(
+                        r"(^.+)((?<=\/)[^\/]+$)", r"\2", text
+                    )
+            else:
+                author_["affiliations"].append(
+                    re.sub(r"(^.+)-(.+$)", r"\2", attrib["ref"])
+                )
+        authors_list.append(author_)
+    return authors_list
+
+
+def xpath_format_biblfull(match):
+    """Per-record XPath implementation used before the precompiled expressions."""
+    pdf = match.xpath(".//editionstmt/edition/ref[contains(@subtype, 'author')]")
+    if len(pdf) == 0:
+        return None
+    if not pdf[0].attrib["target"].endswith(".pdf"):
+        return None
+    if (
+        datetime.strptime(pdf[0].xpath(".//date/@notbefore")[0], "%Y-%m-%d")
+        > datetime.now()
+    ):
+        return None
+
+    parsed_data = {}
+    try:
+        halid = match.xpath(".//idno[contains(@type,'halId')]")[0]
+        title = match.xpath(".//title")[0]
+        authors = match.xpath(".//titlestmt/author[contains(@role, 'aut')]")
+        date = match.xpath(
+            """.//editionstmt/edition[contains(@type, 'current')]
+            /date[contains(@type, 'whenProduced')]
+            """
+        )[0]
+        lang = match.xpath(".//profiledesc/langusage/language/@ident")[0]
+        domain = match.xpath(
+            """.//profiledesc/textclass
+            /classcode[contains(@scheme, 'halDomain')]/@n
+            """
+        )
+    except IndexError:
+        return None
+    parsed_data["halid"] = re.sub(r"(^.+)-(.+$)", r"\2", halid.text)
+    parsed_data["lang"] = lang
+    parsed_data["title"] = title.text
+    parsed_data["domain"] = domain
+    parsed_data["timestamp"] = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
+    parsed_data["year"] = extract_year(date.text)
+    parsed_data["url"] = pdf[0].attrib["target"]
+    parsed_data["authors"] = xpath_parse_authors(authors)
+    return parsed_data
+
+
+def xpath_format_hal(data):
+    """Per-record XPath implementation used before the precompiled expressions."""
+    new_data = []
+    for match in data.xpath("//text/listbibl/biblfull"):
+        parsed_data = xpath_format_biblfull(match)
+        if parsed_data is not None:
+            new_data.append(parsed_data)
+    return new_data
+
+
+def stream_format_hal(page: bytes):
+    """Feeds the page to a ``HALStreamParser`` by chunks, as the crawler does."""
+    parser = HALStreamParser()
+    records = []
+    for start in range(0, len(page), _CHUNK_SIZE):
+        records.extend(parser.feed(page[start : start + _CHUNK_SIZE]))
+    records.extend(parser.close())
+    return records
+
+
+def without_timestamps(records):
+    return [{k: v for k, v in record.items() if k != "timestamp"} for record in records]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the formatting of a saved HAL TEI page."
+    )
+    parser.add_argument(
+        "--fixture_path",
+        type=str,
+        default=_FIXTURE_PATH,
+        help="Path to a TEI page returned by HAL.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Number of timed runs per parser."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.fixture_path, "rb") as f:
+        page = f.read()
+
+    expected = without_timestamps(xpath_format_hal(lxml.html.fromstring(page)))
+    assert without_timestamps(format_hal(lxml.html.fromstring(page))) == expected
+    assert without_timestamps(stream_format_hal(page)) == expected
+    num_records = len(expected)
+
+    runs = {
+        "xpath per record": lambda: xpath_format_hal(lxml.html.fromstring(page)),
+        "format_hal": lambda: format_hal(lxml.html.fromstring(page)),
+        "HALStreamParser": lambda: stream_format_hal(page),
+    }
+    print(f"{num_records} records kept per page")
+    print(f"{'parser':>18} {'time (s)':>10} {'records/s':>10}")
+    for name, run in runs.items():
+        duration = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print(f"{name:>18} {duration:>10.4f} {num_records / duration:>10.0f}")
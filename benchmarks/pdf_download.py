@@ -0,0 +1,93 @@
+# benchmarks/pdf_download.py
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from aiohttp import web
+
+from halvesting.services import PDF
+
+_HOST = "127.0.0.1"
+
+
+def pdf_app(pdf_size: int):
+    """Stand-in for the hosts of the PDFs, serving the same body for every
+    halid."""
+    body = b"%PDF-1.4\n" + b"0" * max(pdf_size - 9, 0)
+
+    async def handler(request: web.Request):
+        return web.Response(body=body, content_type="application/pdf")
+
+    app = web.Application()
+    app.router.add_get("/{halid}.pdf", handler)
+    return app
+
+
+def write_responses(response_dir: str, port: int, num_pdfs: int):
+    """Writes a JSON file of papers whose URLs point to the local server."""
+    papers = [
+        {
+            "halid": f"{i:08d}",
+            "url": f"http://{_HOST}:{port}/{i:08d}.pdf",
+        }
+        for i in range(num_pdfs)
+    ]
+    with open(os.path.join(response_dir, "responses.json"), "w") as f:
+        json.dump(papers, f)
+
+
+async def run(num_pdfs: int, num_chunks: int, pdf_size: int):
+    runner = web.AppRunner(pdf_app(pdf_size), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, _HOST, 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as response_dir:
+            write_responses(response_dir, port, num_pdfs)
+            for keep_alive in (True, False):
+                with tempfile.TemporaryDirectory() as pdf_dir:
+                    start = time.perf_counter()
+                    await PDF._download(
+                        response_dir, pdf_dir, num_chunks, keep_alive=keep_alive
+                    )
+                    duration = time.perf_counter() - start
+                    num_files = sum(
+                        name.endswith(".pdf") for name in os.listdir(pdf_dir)
+                    )
+                    assert num_files == num_pdfs, f"{num_files} PDFs downloaded"
+                results[keep_alive] = duration
+    finally:
+        await runner.cleanup()
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the PDF downloader against a local server, with "
+        "and without keep-alive connections."
+    )
+    parser.add_argument(
+        "--num_pdfs", type=int, default=2000, help="Number of PDFs to download."
+    )
+    parser.add_argument(
+        "--num_chunks", type=int, default=100, help="Number of concurrent downloads."
+    )
+    parser.add_argument(
+        "--pdf_size", type=int, default=2**16, help="Size of each PDF in bytes."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(run(args.num_pdfs, args.num_chunks, args.pdf_size))
+    print(f"{'keep_alive':>10} {'time (s)':>10} {'req/s':>8}")
+    for keep_alive, duration in results.items():
+        req_per_s = args.num_pdfs / duration
+        print(f"{str(keep_alive):>10} {duration:>10.3f} {req_per_s:>8.0f}")
@@ -0,0 +1,67 @@
+# benchmarks/stopwords.py
+
+import argparse
+import json
+import os
+import timeit
+
+from dupe_ngrams import synthetic_paper
+
+from halvesting.utils import DATA_ROOT
+from halvesting.utils.data.postprocessing import _PRECISION, Postprocessing
+
+
+def list_stop_word_fraction(document: Postprocessing, stop_words: list):
+    """List based implementation used before the frozensets."""
+    if document.num_normalized_words == 0:
+        return None
+    num_stop_words = sum(map(lambda w: w in stop_words, document.normalized_words))
+    return round(float(num_stop_words) / document.num_normalized_words, _PRECISION)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the stop word fraction on long papers."
+    )
+    parser.add_argument(
+        "--num_chars",
+        type=int,
+        default=300_000,
+        help="Number of characters of each synthetic paper.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Number of timed runs per language."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(os.path.join(DATA_ROOT, "stopwords.json"), "r", encoding="utf-8") as f:
+        stop_word_lists = json.load(f)
+
+    print(
+        f"{'lang':>4} {'words':>8} {'list (s)':>10} {'frozenset (s)':>14} "
+        f"{'speedup':>8}"
+    )
+    for seed, lang in enumerate(("fr", "en")):
+        document = Postprocessing(text=synthetic_paper(args.num_chars, seed), lang=lang)
+        # Normalizes the text once, outside of the timed runs
+        expected = list_stop_word_fraction(document, stop_word_lists[lang])
+        assert document.rps_doc_stop_word_fraction() == expected
+        list_time = min(
+            timeit.repeat(
+                lambda: list_stop_word_fraction(document, stop_word_lists[lang]),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        set_time = min(
+            timeit.repeat(
+                document.rps_doc_stop_word_fraction, number=1, repeat=args.repeat
+            )
+        )
+        print(
+            f"{lang:>4} {document.num_normalized_words:>8} {list_time:>10.3f} "
+            f"{set_time:>14.4f} {list_time / set_time:>7.0f}x"
+        )
@@ -1,16 +1,15 @@
 # enrich_data.py
 
-import json
 import logging
 import os
 
 import datasets
-from transformers import AutoTokenizer
 
-from halvesting.services import enrich
-from halvesting.utils import (WIDTH, EnricherArgParse, compress,
+from halvesting.services import enrich, required_models, resolve_signals
+from halvesting.utils import (WIDTH, EnricherArgParse, clear_models,
                               download_sentencepiece_kenlm_models,
-                              load_kenlm_model, load_sentencepiece_model,
+                              export_dataset, get_kenlm_model,
+                              get_sentencepiece_model, get_tokenizer,
                               logging_config)
 
 _NUM_DOC_PER_FILE = 10000
@@ -26,7 +25,11 @@ if __name__ == "__main__":
     with open(args.dataset_config_path, "r", encoding="utf-8") as f:
         configs = f.read().splitlines()
 
-    if args.download_models:
+    signals = resolve_signals(args.signals)
+    models = required_models(signals)
+    logging.info(f"Computing {len(signals)} signals: {', '.join(signals)}.")
+
+    if args.download_models and "kenlm" in models:
         download_sentencepiece_kenlm_models(
             output_dir_path=args.kenlm_dir_path, langs=configs
         )
@@ -43,27 +46,42 @@ if __name__ == "__main__":
                 else "~/.cache/huggingface/datasets"
             ),
         )
-        logging.info(f"Loading sentencepiece and kenlm models for {lang}...")
-        sentencepiece_model = load_sentencepiece_model(
-            os.path.join(args.kenlm_dir_path, f"wikipedia_20230501/{lang}.sp.model")
+        sentencepiece_model_path = os.path.join(
+            args.kenlm_dir_path, f"wikipedia_20230501/{lang}.sp.model"
         )
-        kenlm_model = load_kenlm_model(
-            os.path.join(args.kenlm_dir_path, f"wikipedia_20230501/{lang}.arpa.bin")
+        kenlm_model_path = os.path.join(
+            args.kenlm_dir_path, f"wikipedia_20230501/{lang}.arpa.bin"
         )
-        logging.info(f"DONE: Loading sentencepiece and kenlm models for {lang}...")
+        # Loaded in the main process first, so that forked workers inherit them.
+        # Workers only receive the paths and load the models once if needed.
+        if "kenlm" in models:
+            logging.info(f"Loading sentencepiece and kenlm models for {lang}...")
+            get_sentencepiece_model(sentencepiece_model_path)
+            get_kenlm_model(kenlm_model_path)
+            logging.info(f"DONE: Loading sentencepiece and kenlm models for {lang}...")
+        if "tokenizer" in models:
+            if args.tokenizer_checkpoint:
+                get_tokenizer(args.tokenizer_checkpoint, use_fast=args.use_fast)
+            else:
+                get_tokenizer()
         dataset = dataset.map(
             lambda x: enrich(
                 x,
-                sentencepiece_model=sentencepiece_model,
-                kenlm_model=kenlm_model,
+                sentencepiece_model=(
+                    get_sentencepiece_model(sentencepiece_model_path)
+                    if "kenlm" in models
+                    else None
+                ),
+                kenlm_model=(
+                    get_kenlm_model(kenlm_model_path) if "kenlm" in models else None
+                ),
                 lang=lang,
                 tokenizer=(
-                    AutoTokenizer.from_pretrained(
-                        args.tokenizer_checkpoint, use_fast=args.use_fast
-                    )
-                    if args.tokenizer_checkpoint
+                    get_tokenizer(args.tokenizer_checkpoint, use_fast=args.use_fast)
+                    if args.tokenizer_checkpoint and "tokenizer" in models
                     else None
                 ),
+                signals=signals,
             ),
             batched=True,
             batch_size=args.batch_size,
@@ -72,31 +90,15 @@ if __name__ == "__main__":
         )
         logging.info(f"Saving processed dataset for {lang}...")
         os.makedirs(os.path.join(args.output_dir_path, lang), exist_ok=True)
-        counter = 0
-        idx = 0
-        output_path = os.path.join(
-            args.output_dir_path, lang, f"{lang}{args.version}-{counter}.jsonl"
-        )
-        for item in dataset:
-            with open(output_path, "a") as jsf:
-                jsf.write(json.dumps(item, ensure_ascii=False) + "\n")
-            idx += 1
-            if idx % _NUM_DOC_PER_FILE == 0:
-                logging.info(f"Compressing {output_path}...")
-                compress(
-                    lang=lang,
-                    hf_dir_path=args.output_dir_path,
-                    counter=counter,
-                    version=args.version,
-                )
-                counter += 1
-                output_path = os.path.join(
-                    args.output_dir_path, lang, f"{lang}{args.version}-{counter}.jsonl"
-                )
-        logging.info(f"Compressing {output_path}...")
-        compress(
-            lang=lang,
-            hf_dir_path=args.output_dir_path,
-            counter=counter,
-            version=args.version,
+        export_dataset(
+            dataset,
+            os.path.join(args.output_dir_path, lang),
+            f"{lang}{args.version}",
+            max_records=_NUM_DOC_PER_FILE,
+            batch_size=args.batch_size,
+            compression=args.compression,
+            num_proc=args.num_proc,
+            output_format=args.output_format,
+            row_group_size=args.row_group_size,
         )
+        clear_models()
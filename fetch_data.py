@@ -21,6 +21,18 @@ if __name__ == "__main__":
         to_date=args.to_date if args.to_date else None,
         to_hour=args.to_hour if args.to_hour else None,
         response_dir=args.response_dir,
+        num_slices=args.num_slices,
+        max_concurrency=args.max_concurrency,
+        resume=args.resume,
+        num_parsers=args.num_parsers,
+        parse_window=args.parse_window,
+        queue_size=args.queue_size,
+        output_format=args.output_format,
+        compress_output=args.compress_output,
+        max_file_bytes=args.max_file_bytes,
+        run_id=args.run_id,
+        max_retries=args.max_retries,
+        rate_limit=args.api_rate_limit,
     )
     hal()
 
@@ -32,4 +44,16 @@ if __name__ == "__main__":
             response_dir=args.response_dir,
             pdf_dir=args.pdf_dir,
             num_chunks=args.num_chunks,
+            limit_per_host=args.limit_per_host,
+            keep_alive=args.keep_alive,
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+            max_size=args.max_pdf_size,
+            incremental=args.incremental,
+            revalidate=args.revalidate,
+            max_retries=args.max_retries,
+            rate_limit=args.pdf_rate_limit,
+            shard_layout=args.shard_layout,
+            shard_depth=args.shard_depth,
+            num_writers=args.num_writers,
         )
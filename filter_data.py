@@ -1,13 +1,13 @@
 # filter_data.py
 
-import json
 import logging
 import os
 
 import datasets
 
 from halvesting.services import filter_
-from halvesting.utils import WIDTH, FilteringArgParse, compress, logging_config
+from halvesting.utils import (WIDTH, FilteringArgParse, export_dataset,
+                              logging_config)
 
 NUM_DOC_PER_FILE = 10000
 COLUMNS = [
@@ -65,38 +65,24 @@ if __name__ == "__main__":
             num_proc=args.num_proc,  # type: ignore
             load_from_cache_file=args.load_from_cache_file,  # type: ignore
         )
-        dataset = dataset.remove_columns(COLUMNS)
+        # Enrichment may only have computed some of the signals
+        dataset = dataset.remove_columns(
+            [column for column in COLUMNS if column in dataset.column_names]
+        )
         post_len = len(dataset)
         logging.info(f"Filtered {pre_len - post_len} for {lang}.")
         if post_len == 0:
             continue
         logging.info(f"Saving processed dataset for {lang}...")
         os.makedirs(os.path.join(args.output_dir_path, lang), exist_ok=True)
-        counter = 0
-        idx = 0
-        output_path = os.path.join(
-            args.output_dir_path, lang, f"{lang}{args.version}-{counter}.jsonl"
-        )
-        for item in dataset:
-            with open(output_path, "a") as jsf:
-                jsf.write(json.dumps(item, ensure_ascii=False) + "\n")
-            idx += 1
-            if idx % NUM_DOC_PER_FILE == 0:
-                logging.info(f"Compressing {output_path}...")
-                compress(
-                    lang=lang,
-                    hf_dir_path=args.output_dir_path,
-                    counter=counter,
-                    version=args.version,
-                )
-                counter += 1
-                output_path = os.path.join(
-                    args.output_dir_path, lang, f"{lang}{args.version}-{counter}.jsonl"
-                )
-        logging.info(f"Compressing {output_path}...")
-        compress(
-            lang=lang,
-            hf_dir_path=args.output_dir_path,
-            counter=counter,
-            version=args.version,
+        export_dataset(
+            dataset,
+            os.path.join(args.output_dir_path, lang),
+            f"{lang}{args.version}",
+            max_records=NUM_DOC_PER_FILE,
+            batch_size=args.batch_size,
+            compression=args.compression,
+            num_proc=args.num_proc,
+            output_format=args.output_format,
+            row_group_size=args.row_group_size,
         )
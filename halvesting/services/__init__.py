@@ -2,7 +2,8 @@
 
 from halvesting.services.api import HAL
 from halvesting.services.downloader import PDF
-from halvesting.services.enricher import enrich
+from halvesting.services.enricher import (SIGNALS, enrich, required_models,
+                                          resolve_signals)
 from halvesting.services.filtering import filter_
 from halvesting.services.merger import Merger
 
@@ -12,4 +13,7 @@ __all__ = [
     "PDF",
     "Merger",
     "enrich",
+    "SIGNALS",
+    "resolve_signals",
+    "required_models",
 ]
@@ -1,18 +1,30 @@
 # halvesting/services/api.py
 
 import asyncio
+import glob
+import json
 import logging
-from typing import Optional
+import os
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Optional
 from urllib import parse
 
 import aiohttp
-import lxml.etree
-import lxml.html
 
+from halvesting.services.http_client import RetryClient
 from halvesting.utils import check_dir
-from halvesting.utils.data import Flusher, format_hal
+from halvesting.utils.data import (Flusher, HALStreamParser, format_hal_page,
+                                   read_hal_header)
 
 _NUM_DOC_PER_FILE = 10000
+_CHUNK_SIZE = 2**16
+_LOG_METRICS_EVERY = 100
+_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+_STATE_PREFIX = ".crawl_state_"
 
 
 class HAL:
@@ -32,23 +44,92 @@ class HAL:
         Maximum hour of deposit on HAL for a given paper on ``to_date`` day.
     response_dir : str, optional
         Path to the directory containing the JSON files with papers' metadata.
+    num_slices : int, optional
+        Number of date sub-ranges crawled concurrently. Requires both ``from_date``
+        and ``to_date``.
+    max_concurrency : int, optional
+        Maximum number of requests sent to HAL at the same time.
+    resume : bool, default=False
+        If ``True``, the crawl restarts from the last checkpoint saved in
+        ``response_dir`` by the run ``run_id``, or by the latest run with the same
+        query and time frame if ``run_id`` is not given.
+    num_parsers : int, optional
+        Number of worker processes parsing the responses. If not given, responses
+        are parsed in the event loop while being downloaded.
+    parse_window : int, optional
+        Maximum number of pages downloaded but not yet parsed by the workers.
+    queue_size : int, optional
+        Maximum number of pages waiting between the crawler and the formatter.
+    output_format : str, optional
+        Format of the files written in ``response_dir``: "json" or "jsonl".
+    compress_output : bool, default=False
+        If ``True``, JSON lines files are compressed with gzip.
+    max_file_bytes : int, optional
+        Maximum size in bytes of a JSON lines file before starting a new one.
+    run_id : str, optional
+        Identifier of the run, used to name its files, checkpoint and manifest so
+        that several crawlers can write to the same ``response_dir``.
+    max_retries : int, optional
+        Maximum number of retries of a page on connection errors, timeouts and
+        transient HTTP statuses.
+    rate_limit : float, optional
+        Maximum number of requests per second sent to HAL. No limit if not given.
 
     Attributes
     ----------
     _base_url : str
         Static part of the HAL's API's URL.
     _extended_url : str
-        Static part of the URL to put after ``self.query`` and before
-        ``self._cursor_url``.
-    _cursor_url : str
-        Cursor used by the `HAL's API for pagination`_ .
+        Static part of the URL to put after ``self.query`` and before the cursor.
+    _cursors : Dict[str, str]
+        Cursor used by the `HAL's API for pagination`_ for each date sub-range. Only
+        the cursors of pages already written to disk are kept.
+    _num_pages : int
+        Number of pages written to disk.
+    _counter : int
+        Index of the next file written by the ``Flusher``.
     query : str, optional
         Search keyword.
     date_last_index : str, default="[* TO *]"
         This string modifies the request to restrict the upload time of the responses to
         a given time frame.
+    from_datetime : datetime.datetime, optional
+        Lower bound of the time frame.
+    to_datetime : datetime.datetime, optional
+        Upper bound of the time frame.
     response_dir : str, default="./data/responses"
         Path to the directory containing the JSON files with papers' metadata.
+    num_slices : int, default=1
+        Number of date sub-ranges crawled concurrently.
+    max_concurrency : int, default=4
+        Maximum number of requests sent to HAL at the same time.
+    run_id : str
+        Identifier of the run. Randomly generated if not given nor resumed.
+    state_path : str
+        Path to the checkpoint file, saved in ``response_dir`` every time the
+        ``Flusher`` writes a file.
+    num_parsers : int, default=0
+        Number of worker processes parsing the responses.
+    parse_window : int, default=8
+        Maximum number of pages downloaded but not yet parsed by the workers.
+    queue_size : int, default=16
+        Maximum number of pages waiting between the crawler and the formatter.
+    output_format : str, default="json"
+        Format of the files written in ``response_dir``.
+    compress_output : bool
+        If ``True``, JSON lines files are compressed with gzip.
+    max_file_bytes : int, optional
+        Maximum size in bytes of a JSON lines file before starting a new one.
+    max_retries : int, default=5
+        Maximum number of retries of a page.
+    rate_limit : float, optional
+        Maximum number of requests per second sent to HAL.
+    metrics : defaultdict(float)
+        Counters describing the pipeline: number of pages going through the queue,
+        maximum queue depth, and total time in seconds spent by the crawler waiting
+        for room in the queue (``producer_wait``) and by the formatter waiting for
+        pages (``consumer_wait``). A crawler mostly waiting on the formatter means
+        parsing is the bottleneck, and conversely for the network.
 
 
     ..  _`HAL's API`: https://api.archives-ouvertes.fr/docs`
@@ -68,16 +149,47 @@ class HAL:
         to_date: Optional[str] = None,
         to_hour: Optional[str] = None,
         response_dir: Optional[str] = None,
+        num_slices: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        resume: bool = False,
+        num_parsers: Optional[int] = None,
+        parse_window: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        output_format: Optional[str] = None,
+        compress_output: bool = False,
+        max_file_bytes: Optional[int] = None,
+        run_id: Optional[str] = None,
+        max_retries: Optional[int] = None,
+        rate_limit: Optional[float] = None,
     ):
-        self._cursor_url = "*"
+        self._cursors = {}
+        self._num_pages = 0
+        self._counter = 1
         self.query = query if query is not None else "*"
         self.response_dir = (
             check_dir(response_dir)
             if response_dir is not None
             else check_dir("./data/response")
         )
+        self.run_id = run_id
+        self.num_slices = num_slices if num_slices is not None else 1
+        self.max_concurrency = max_concurrency if max_concurrency is not None else 4
+        self.num_parsers = num_parsers if num_parsers is not None else 0
+        self.parse_window = parse_window if parse_window is not None else 8
+        self.queue_size = queue_size if queue_size is not None else 16
+        self.output_format = output_format if output_format is not None else "json"
+        self.compress_output = compress_output
+        self.max_file_bytes = max_file_bytes
+        self.max_retries = max_retries if max_retries is not None else 5
+        self.rate_limit = rate_limit
+        self.metrics = defaultdict(float)
+        self.from_datetime = None
+        self.to_datetime = None
         if from_date is not None:
             from_hour = from_hour if from_hour is not None else "00:00:00"
+            self.from_datetime = datetime.strptime(
+                f"{from_date}T{from_hour}", _DATETIME_FORMAT
+            )
             self.date_last_index = (
                 f"&fq=dateLastIndexed_tdate:[{from_date}T{from_hour}Z "
             )
@@ -85,9 +197,19 @@ class HAL:
             self.date_last_index = f"&fq=dateLastIndexed_tdate:[* "
         if to_date is not None:
             to_hour = to_hour if to_hour is not None else "00:00:00"
+            self.to_datetime = datetime.strptime(
+                f"{to_date}T{to_hour}", _DATETIME_FORMAT
+            )
             self.date_last_index += f"TO {to_date}T{to_hour}Z]"
         else:
             self.date_last_index += f"TO *]"
+        if resume:
+            self._load_state()
+        if self.run_id is None:
+            self.run_id = uuid.uuid4().hex[:8]
+        self.state_path = os.path.join(
+            self.response_dir, f"{_STATE_PREFIX}{self.run_id}"
+        )
 
     def __call__(self):
         """Start crawling through HAL and format the returned documents
@@ -95,74 +217,403 @@ class HAL:
         loop = asyncio.get_event_loop()
         loop.run_until_complete(self.get())
 
-    async def _scrape(self, queue: asyncio.Queue):
-        """Scrape HAL API to get documents.
+    def _load_state(self):
+        """Restores the run identifier, the cursors, the number of pages and
+        the file counter from a checkpoint in ``self.response_dir``.
+
+        Raises
+        ------
+        ValueError
+            If the checkpoint of ``self.run_id`` was saved by a crawl with
+            different parameters.
+        """
+        if self.run_id is not None:
+            state_paths = [
+                os.path.join(self.response_dir, f"{_STATE_PREFIX}{self.run_id}")
+            ]
+        else:
+            state_paths = sorted(
+                (
+                    state_path
+                    for state_path in glob.glob(
+                        os.path.join(self.response_dir, f"{_STATE_PREFIX}*")
+                    )
+                    if not state_path.endswith(".tmp")
+                ),
+                key=os.path.getmtime,
+                reverse=True,
+            )
+
+        for state_path in state_paths:
+            if not os.path.isfile(state_path):
+                continue
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if (
+                state["query"] == self.query
+                and state["date_last_index"] == self.date_last_index
+                and not set(state["cursors"]) - set(self._date_slices())
+            ):
+                break
+            if self.run_id is not None:
+                raise ValueError(
+                    f"The checkpoint at {state_path} belongs to another crawl."
+                )
+        else:
+            logging.warning(
+                f"No checkpoint to resume in {self.response_dir}: starting over."
+            )
+            return
+
+        self.run_id = state["run_id"]
+        self._cursors = state["cursors"]
+        self._num_pages = state["num_pages"]
+        self._counter = state["counter"]
+        logging.info(f"Resuming crawl after {self._num_pages} pages from {state_path}.")
+
+    def _save_state(self):
+        """Atomically writes the run identifier, the cursors, the number of
+        pages and the file counter to ``self.state_path``."""
+        state = {
+            "run_id": self.run_id,
+            "query": self.query,
+            "date_last_index": self.date_last_index,
+            "cursors": self._cursors,
+            "num_pages": self._num_pages,
+            "counter": self._counter,
+        }
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    async def _put(self, queue: asyncio.Queue, item: Any):
+        """Puts an item in the queue and records the time spent waiting for
+        room.
+
+        Parameters
+        ----------
+        queue : asyncio.Queue
+            Asynchronous queue for storing scraped data.
+        item : Any
+            Item to put in the queue.
+        """
+        start = time.perf_counter()
+        await queue.put(item)
+        self.metrics["producer_wait"] += time.perf_counter() - start
+        self.metrics["max_queue_depth"] = max(
+            self.metrics["max_queue_depth"], queue.qsize()
+        )
+
+    async def _get(self, queue: asyncio.Queue):
+        """Gets an item from the queue, records the time spent waiting for it,
+        and periodically logs the metrics.
 
         Parameters
         ----------
         queue : asyncio.Queue
             Asynchronous queue for storing scraped data.
+
+        Returns
+        -------
+        item: Any
+            Item taken from the queue.
+        """
+        start = time.perf_counter()
+        item = await queue.get()
+        self.metrics["consumer_wait"] += time.perf_counter() - start
+        self.metrics["pages"] += 1
+        if self.metrics["pages"] % _LOG_METRICS_EVERY == 0:
+            self._log_metrics(queue)
+        return item
+
+    def _log_metrics(self, queue: asyncio.Queue):
+        """Logs the pipeline's metrics.
+
+        Parameters
+        ----------
+        queue : asyncio.Queue
+            Asynchronous queue for storing scraped data.
+        """
+        logging.info(
+            f"Pages: {int(self.metrics['pages'])} | "
+            f"Queue depth: {queue.qsize()}/{queue.maxsize} "
+            f"(max {int(self.metrics['max_queue_depth'])}) | "
+            f"Crawler wait: {self.metrics['producer_wait']:.1f}s | "
+            f"Formatter wait: {self.metrics['consumer_wait']:.1f}s"
+        )
+
+    def _date_slices(self):
+        """Splits ``self.date_last_index`` into ``self.num_slices`` contiguous
+        sub-ranges of equal duration. Every sub-range but the last one excludes
+        its upper bound so that no document is fetched twice.
+
+        Returns
+        -------
+        date_slices: List[str]
+            Filter queries restricting the upload time of the responses.
+        """
+        if self.num_slices <= 1:
+            return [self.date_last_index]
+        if self.from_datetime is None or self.to_datetime is None:
+            logging.warning(
+                "Date slicing requires both `from_date` and `to_date`: "
+                "crawling the whole time frame with a single cursor."
+            )
+            return [self.date_last_index]
+
+        step = (self.to_datetime - self.from_datetime) / self.num_slices
+        bounds = [self.from_datetime + i * step for i in range(self.num_slices)]
+        bounds.append(self.to_datetime)
+        date_slices = []
+        for i in range(self.num_slices):
+            lower = bounds[i].strftime(_DATETIME_FORMAT)
+            upper = bounds[i + 1].strftime(_DATETIME_FORMAT)
+            closing = "]" if i == self.num_slices - 1 else "}"
+            date_slices.append(
+                f"&fq=dateLastIndexed_tdate:[{lower}Z TO {upper}Z{closing}"
+            )
+        return date_slices
+
+    def _url(self, date_last_index: str, cursor: str):
+        """Builds the URL of a page of results.
+
+        Parameters
+        ----------
+        date_last_index : str
+            Filter query restricting the upload time of the responses.
+        cursor : str
+            Cursor used by the `HAL's API for pagination`_ .
+
+        Returns
+        -------
+        url: str
+            Quoted URL.
         """
         url = parse.quote(
-            f"{self._base_url}{self.query}{self.date_last_index}"
-            + f"{self._extended_url}{self._cursor_url}",
+            f"{self._base_url}{self.query}{date_last_index}"
+            + f"{self._extended_url}{cursor}",
             safe="?/:&=*+-_[]",
-        )  # base url
-        logging.info(url)
+        )
+        return url
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                data = await response.read()
-
-            xml_data = lxml.html.fromstring(data)
-            measures = xml_data.findall(".//measure")
-            # Total number of match
-            search_results = int(measures[0].attrib["quantity"])
-            logging.info(f"Found {search_results} matchs")
+    @staticmethod
+    async def _parse_response(response: aiohttp.ClientResponse):
+        """Parses a page while it is being downloaded. A new parser is used
+        for every attempt, so that a retried page is never parsed twice.
+
+        Parameters
+        ----------
+        response : aiohttp.ClientResponse
+            Response from HAL.
+
+        Returns
+        -------
+        formatted_data: List[Dict[str, Any]]
+            Formatted publications.
+        next_cursor: str | None
+            Cursor of the next page.
+        measures: List[int]
+            Total number of matchs, then number of returned documents.
+        """
+        response.raise_for_status()
+        parser = HALStreamParser()
+        formatted_data = []
+        async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+            formatted_data.extend(parser.feed(chunk))
+        formatted_data.extend(parser.close())
+        return formatted_data, parser.next_cursor, parser.measures
+
+    @staticmethod
+    async def _read_response(response: aiohttp.ClientResponse):
+        """Reads the raw body of a page.
+
+        Parameters
+        ----------
+        response : aiohttp.ClientResponse
+            Response from HAL.
+
+        Returns
+        -------
+        data: bytes
+            Raw page.
+        """
+        response.raise_for_status()
+        return await response.read()
+
+    async def _scrape_slice(
+        self,
+        queue: asyncio.Queue,
+        client: RetryClient,
+        semaphore: asyncio.Semaphore,
+        date_last_index: str,
+        executor: Optional[ProcessPoolExecutor] = None,
+        window: Optional[asyncio.Semaphore] = None,
+    ):
+        """Follows the cursor chain of a single date sub-range. Without
+        ``executor``, each page is parsed while it is being downloaded and only
+        its formatted publications are queued. Otherwise, the raw page is sent
+        to the workers and the pending result is queued, so that the next
+        request is issued without waiting for the parsing.
+
+        Parameters
+        ----------
+        queue : asyncio.Queue
+            Asynchronous queue for storing scraped data.
+        client : halvesting.services.http_client.RetryClient
+            Client shared by every sub-range, retrying the failed pages.
+        semaphore : asyncio.Semaphore
+            Caps the number of concurrent requests.
+        date_last_index : str
+            Filter query restricting the upload time of the responses.
+        executor : concurrent.futures.ProcessPoolExecutor, optional
+            Pool of workers parsing the responses.
+        window : asyncio.Semaphore, optional
+            Caps the number of pages sent to ``executor`` and not yet parsed.
+        """
+        loop = asyncio.get_running_loop()
+        cursor = self._cursors.get(date_last_index, "*")
+        first_page = True
+        while True:
+            url = self._url(date_last_index, cursor)
+            logging.info(url)
+
+            if executor is None:
+                async with semaphore:
+                    formatted_data, next_cursor, measures = await client.fetch(
+                        url, self._parse_response
+                    )
+            else:
+                async with semaphore:
+                    data = await client.fetch(url, self._read_response)
+                next_cursor, measures = read_hal_header(data)
+
+            if first_page:
+                # Total number of match
+                search_results = measures[0]
+                logging.info(f"Found {search_results} matchs")
+                first_page = False
             # Number of returned documents
-            document_results = int(measures[1].attrib["quantity"])
-
-            while document_results != 0:  # While the API keeps finding matches
-                await queue.put(xml_data)
-                self._cursor_url = xml_data.attrib["next"]
-                url = parse.quote(
-                    f"{self._base_url}{self.query}{self.date_last_index}"
-                    + f"{self._extended_url}{self._cursor_url}",
-                    safe="?/:&=*+-_[]",
+            document_results = measures[1]
+
+            if document_results == 0:  # The API stopped finding matches
+                break
+
+            if executor is not None:
+                await window.acquire()  # type: ignore
+                formatted_data = loop.run_in_executor(executor, format_hal_page, data)
+                formatted_data.add_done_callback(
+                    lambda _: window.release()  # type: ignore
                 )
-                logging.info(url)
+            cursor = next_cursor
+            await self._put(queue, (date_last_index, cursor, formatted_data))
 
-                async with session.get(url) as response:
-                    data = await response.read()
+    async def _scrape(
+        self, queue: asyncio.Queue, executor: Optional[ProcessPoolExecutor] = None
+    ):
+        """Scrape HAL API to get documents. Each date sub-range is crawled with
+        its own cursor on a shared session. Failed pages are retried with a
+        jittered exponential backoff, and the requests are throttled to
+        ``self.rate_limit`` per second.
 
-                xml_data = lxml.html.fromstring(data)
-                measures = xml_data.findall(".//measure")
-                # Number of returned documents
-                document_results = int(measures[1].attrib["quantity"])
+        Parameters
+        ----------
+        queue : asyncio.Queue
+            Asynchronous queue for storing scraped data.
+        executor : concurrent.futures.ProcessPoolExecutor, optional
+            Pool of workers parsing the responses.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        window = asyncio.Semaphore(self.parse_window)
+        async with aiohttp.ClientSession() as session:
+            client = RetryClient(
+                session,
+                max_retries=self.max_retries,
+                rate_limit=self.rate_limit,
+                burst=self.max_concurrency,
+            )
+            await asyncio.gather(
+                *(
+                    self._scrape_slice(
+                        queue, client, semaphore, date_last_index, executor, window
+                    )
+                    for date_last_index in self._date_slices()
+                )
+            )
 
-        await queue.put(None)
+        await self._put(queue, None)
 
     async def _format(self, queue: asyncio.Queue):
-        """Format the scraped data and save it.
+        """Save the formatted data. A checkpoint is saved every time the
+        ``Flusher`` writes a file, so that only the cursors of pages
+        already on disk are committed. Pages parsed by worker processes are
+        awaited in the order they were requested to keep the checkpoints exact.
 
         Parameters
         ----------
         queue : asyncio.Queue
             Asynchronous queue for storing scraped data.
         """
-        with Flusher(self.response_dir, _NUM_DOC_PER_FILE) as flusher:
+        with Flusher(
+            self.response_dir,
+            _NUM_DOC_PER_FILE,
+            counter=self._counter,
+            output_format=self.output_format,
+            compress=self.compress_output,
+            max_bytes=self.max_file_bytes,
+            run_id=self.run_id,
+        ) as flusher:
             while True:
-                data = await queue.get()
+                data = await self._get(queue)
 
                 if data is None:
                     break
 
-                formatted_data = format_hal(data)
+                date_last_index, cursor, formatted_data = data
+                if isinstance(formatted_data, asyncio.Future):
+                    formatted_data = await formatted_data
                 flusher.save(formatted_data)
+                self._cursors[date_last_index] = cursor
+                self._num_pages += 1
+                if flusher.num_pending == 0:  # Every page saved is on disk
+                    self._counter = flusher.counter
+                    self._save_state()
+        self._counter = flusher.counter
+        self._save_state()
+        self._log_metrics(queue)
+
+    async def _run(
+        self, queue: asyncio.Queue, executor: Optional[ProcessPoolExecutor] = None
+    ):
+        """Runs the scraper and the formatter concurrently. If one of them fails,
+        the other one is cancelled and awaited, so that the ``Flusher`` discards
+        the records that were not checkpointed.
+
+        Parameters
+        ----------
+        queue : asyncio.Queue
+            Asynchronous queue for storing scraped data.
+        executor : concurrent.futures.ProcessPoolExecutor, optional
+            Pool of workers parsing the responses.
+        """
+        scraper = asyncio.ensure_future(self._scrape(queue, executor))
+        formatter = asyncio.ensure_future(self._format(queue))
+        try:
+            await asyncio.gather(scraper, formatter)
+        finally:
+            scraper.cancel()
+            formatter.cancel()
+            await asyncio.gather(scraper, formatter, return_exceptions=True)
 
     async def get(self):
         """Crawls through HAL and formats the returned documents
         concurrently."""
-        queue = asyncio.Queue()
-        # Queue like asynchronous task
-        await asyncio.gather(self._scrape(queue), self._format(queue))
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.num_parsers > 0:
+            with ProcessPoolExecutor(self.num_parsers) as executor:
+                await self._run(queue, executor)
+        else:
+            # Queue like asynchronous task
+            await self._run(queue)
@@ -1,156 +1,581 @@
-# halvesting/services/downloader.py
-
-import asyncio
-import json
-import logging
-import os
-import sys
-import time
-
-import aiofiles
-import aiohttp
-from tqdm import tqdm
-
-from halvesting.utils import check_dir
-
-_CONNECTOR = aiohttp.TCPConnector(force_close=True)
-
-
-class PDF:
-    """Class used to download PDF files from a list of URLs contained within a
-    JSON file.
-
-    Examples
-    --------
-    >>> from halvesting.services import PDF
-    >>> PDF.download("./data/responses", "./data/pdfs", 100)
-    """
-
-    @classmethod
-    def _get_urls(cls, response_dir: str):
-        """Get PDF URLs from JSON files.
-
-        Parameters
-        ----------
-        response_dir : str
-            Directory containing the fetched data from HAL in JSON files.
-
-        Yields
-        ------
-        Tuple[str, str]
-            Tuple containing halid and PDF URL.
-        """
-        js_files = os.listdir(response_dir)
-
-        js_paths = [
-            os.path.join(response_dir, js_file)
-            for js_file in js_files
-            if js_file.endswith(".json")
-        ]
-
-        if not js_paths:
-            sys.exit(
-                f"""Directory at {response_dir} is empty or does not contain \
-                `json` files."""
-            )
-
-        for js_path in js_paths:
-            with open(js_path, "r", encoding="utf-8") as jsf:
-                papers = json.load(jsf)
-            for paper in papers:
-                halid = paper["halid"]
-                url = paper["url"]
-                yield halid, url
-
-    @classmethod
-    def _chunked_http_client(cls, num_chunks: int):
-
-        semaphore = asyncio.Semaphore(num_chunks)
-
-        async def http_get(halid: str, url: str, client_session: aiohttp.ClientSession):
-            """Asynchronous requester.
-
-            Parameters
-            ----------
-            halid: str
-                The halid of the PDF to be downloaded.
-            url: str
-                URLs used to download the PDF.
-            client_session: ClientSession
-                ``aiohttp`` client session used to get data.
-
-            Returns
-            -------
-            halid: str
-                The halid of the downloaded PDF.
-            pdf_binary.content.read()
-                PDF content.
-            """
-            nonlocal semaphore
-            async with semaphore:
-                try:
-                    async with client_session.request("GET", url) as pdf_binary:
-                        pdf = await pdf_binary.content.read()
-                    return halid, pdf
-                except (
-                    aiohttp.ServerDisconnectedError,
-                    aiohttp.ClientConnectorError,
-                    asyncio.TimeoutError,
-                ):
-                    logging.warning(f"Couldn't access {halid} at {url}")
-                    return halid, None
-
-        return http_get
-
-    @classmethod
-    async def _download(cls, response_dir: str, pdf_dir: str, num_chunks: int):
-        """Download PDFs from URLs found in response_dir's documents.
-
-        Parameters
-        ----------
-        response_dir : str
-            Directory containing the fetched data from HAL in JSON files.
-        pdf_dir : str
-            Target directory to download the PDFs.
-        num_chunks : int
-            Number of semaphores.
-        """
-        urls = cls._get_urls(response_dir)
-        http_client = cls._chunked_http_client(num_chunks)
-
-        async with aiohttp.ClientSession(connector=_CONNECTOR) as client_session:
-            tasks = [http_client(halid, url, client_session) for halid, url in urls]
-            for future in tqdm(asyncio.as_completed(tasks)):
-                halid, pdf = await future
-
-                if pdf is None:
-                    continue
-
-                pdf_file = os.path.join(check_dir(pdf_dir), f"{halid}.pdf")
-                logging.info(pdf_file)
-                async with aiofiles.open(pdf_file, "wb") as f:
-                    await f.write(pdf)
-
-    @classmethod
-    def download(cls, response_dir: str, pdf_dir: str, num_chunks: int):
-        """Download PDFs from URLs found in response_dir's documents.
-
-        Parameters
-        ----------
-        response_dir: str
-            Directory containing the fetched data from HAL in JSON files.
-        pdf_dir: str
-            Target directory to download the PDFs.
-        num_chunks: int
-            Number of semaphores.
-        """
-        if pdf_dir is None:
-            raise TypeError("``pdf_dir`` expected ``str`` but got ``None``")
-        if num_chunks is None:
-            raise TypeError("``num_chunks`` expected ``int`` but got ``None``")
-
-        loop = asyncio.get_event_loop()
-        start = time.time()
-        loop.run_until_complete(cls._download(response_dir, pdf_dir, num_chunks))
-        end = time.time()
-        logging.info(f"Time: {end - start}")
+# halvesting/services/downloader.py
+
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import aiohttp
+from tqdm import tqdm
+
+from halvesting.services.http_client import RetryClient
+from halvesting.utils import check_dir
+from halvesting.utils.data import Ledger, is_record_file, iter_records
+
+_DNS_CACHE_TTL = 300
+_KEEPALIVE_TIMEOUT = 30
+_QUEUE_SIZE_PER_WORKER = 2
+_CHUNK_SIZE = 2**16
+_LEDGER_FILE = ".ledger.sqlite"
+_SHARD_LAYOUTS = ("flat", "prefix", "hash")
+# HTTP statuses that a retry cannot fix
+_PERMANENT_STATUSES = (400, 404, 410)
+
+
+class PDF:
+    """Class used to download PDF files from a list of URLs contained within a
+    JSON file.
+
+    Notes
+    -----
+    Connections are kept alive and pooled by default: almost every PDF is hosted on
+    the same few hosts, so reusing connections avoids a TCP and TLS handshake per
+    download. Every download is recorded in a SQLite ledger stored in the PDF
+    directory, which allows incremental downloads. The ledger is read and written by
+    a dedicated thread, off the event loop. Transient failures are retried
+    with a jittered exponential backoff, and the requests can be throttled per host.
+
+    The PDFs can be spread over nested sub-directories named after the first
+    characters of their halid (``prefix``) or of its MD5 hash (``hash``), e.g.
+    `pdf_dir/02/97/02975689.pdf`, to keep every directory small. Files are written
+    by a bounded pool of threads so that the disk never blocks the event loop.
+
+    Examples
+    --------
+    >>> from halvesting.services import PDF
+    >>> PDF.download("./data/responses", "./data/pdfs", 100)
+    """
+
+    @classmethod
+    def _get_urls(cls, response_dir: str):
+        """Get PDF URLs from JSON files.
+
+        Parameters
+        ----------
+        response_dir : str
+            Directory containing the fetched data from HAL in `json`, `jsonl` or
+            `jsonl.gz` files.
+
+        Yields
+        ------
+        Tuple[str, str]
+            Tuple containing halid and PDF URL.
+        """
+        js_files = os.listdir(response_dir)
+
+        js_paths = [
+            os.path.join(response_dir, js_file)
+            for js_file in js_files
+            if is_record_file(js_file)
+        ]
+
+        if not js_paths:
+            sys.exit(
+                f"""Directory at {response_dir} is empty or does not contain \
+                `json` files."""
+            )
+
+        for js_path in js_paths:
+            for paper in iter_records(js_path):
+                halid = paper["halid"]
+                url = paper["url"]
+                yield halid, url
+
+    @classmethod
+    def _session(
+        cls,
+        num_chunks: int,
+        limit_per_host: int,
+        keep_alive: bool,
+        connect_timeout: Optional[float],
+        read_timeout: Optional[float],
+    ):
+        """Builds the client session. Must be called from within the running
+        event loop.
+
+        Parameters
+        ----------
+        num_chunks : int
+            Maximum number of simultaneous connections.
+        limit_per_host : int
+            Maximum number of simultaneous connections to the same host. 0 means no
+            limit.
+        keep_alive : bool
+            If ``False``, each connection is closed after its request.
+        connect_timeout : float, optional
+            Timeout in seconds to establish a connection.
+        read_timeout : float, optional
+            Timeout in seconds between two reads of a response.
+
+        Returns
+        -------
+        client_session: aiohttp.ClientSession
+            ``aiohttp`` client session used to get data.
+        """
+        connector = aiohttp.TCPConnector(
+            limit=num_chunks,
+            limit_per_host=limit_per_host,
+            ttl_dns_cache=_DNS_CACHE_TTL,
+            force_close=not keep_alive,
+            keepalive_timeout=_KEEPALIVE_TIMEOUT if keep_alive else None,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    @classmethod
+    def _pdf_path_builder(cls, pdf_dir: str, shard_layout: str, shard_depth: int):
+        """Builds the function mapping a halid to the path of its PDF. Each
+        shard directory is created the first time it is used.
+
+        Parameters
+        ----------
+        pdf_dir : str
+            Target directory to download the PDFs.
+        shard_layout : str
+            Either "flat", "prefix" or "hash".
+        shard_depth : int
+            Number of nested shard directories, each named after two characters.
+
+        Returns
+        -------
+        pdf_path: Callable[[str], str]
+            Function returning the path to the PDF of a halid.
+        """
+        if shard_layout not in _SHARD_LAYOUTS:
+            raise ValueError(
+                f"``shard_layout`` expected one of {_SHARD_LAYOUTS} but got "
+                f"{shard_layout}"
+            )
+        pdf_dir = check_dir(pdf_dir)
+        shards = set()
+
+        def pdf_path(halid: str):
+            if shard_layout == "flat" or shard_depth <= 0:
+                return os.path.join(pdf_dir, f"{halid}.pdf")
+            if shard_layout == "hash":
+                key = hashlib.md5(halid.encode("utf-8")).hexdigest()
+            else:
+                key = halid.ljust(2 * shard_depth, "_")
+            shard = os.path.join(
+                pdf_dir, *(key[2 * i : 2 * i + 2] for i in range(shard_depth))
+            )
+            if shard not in shards:
+                os.makedirs(shard, exist_ok=True)
+                shards.add(shard)
+            return os.path.join(shard, f"{halid}.pdf")
+
+        return pdf_path
+
+    @classmethod
+    def _chunked_http_client(
+        cls,
+        writer: ThreadPoolExecutor,
+        max_size: Optional[int] = None,
+    ):
+
+        async def http_get(
+            halid: str,
+            url: str,
+            client: RetryClient,
+            pdf_file: str,
+            headers: Optional[Dict[str, str]] = None,
+        ):
+            """Asynchronous requester streaming the PDF to a temporary file,
+            renamed to ``pdf_file`` once the download is complete.
+
+            Parameters
+            ----------
+            halid: str
+                The halid of the PDF to be downloaded.
+            url: str
+                URLs used to download the PDF.
+            client: halvesting.services.http_client.RetryClient
+                Client used to get data, retrying the transient failures.
+            pdf_file: str
+                Path to the downloaded PDF.
+            headers: Dict[str, str], optional
+                Additional headers, used to send conditional requests.
+
+            Returns
+            -------
+            halid: str
+                The halid of the downloaded PDF.
+            result: Dict[str, Any]
+                Status of the download ("done", "unchanged", "failed" or
+                "rejected"). A successful download also gives the size and sha256
+                checksum of the file and the ``ETag`` and ``Last-Modified`` headers.
+                A failed one gives the reason of the last failure, once the retries
+                are exhausted. "rejected" marks the failures that retrying cannot
+                fix: an HTTP 400, 404 or 410, or a PDF larger than ``max_size``.
+            """
+            part_file = f"{pdf_file}.part"
+
+            async def write(pdf_binary: aiohttp.ClientResponse):
+                """Streams the body to ``part_file``. Each chunk is written by
+                ``writer`` while the next one is being read."""
+                loop = asyncio.get_running_loop()
+                size = 0
+                hasher = hashlib.sha256()
+                f = await loop.run_in_executor(writer, open, part_file, "wb")
+                pending = None
+                try:
+                    async for chunk in pdf_binary.content.iter_chunked(_CHUNK_SIZE):
+                        size += len(chunk)
+                        if max_size is not None and size > max_size:
+                            break
+                        hasher.update(chunk)
+                        if pending is not None:
+                            await pending
+                        pending = loop.run_in_executor(writer, f.write, chunk)
+                    if pending is not None:
+                        await pending
+                finally:
+                    if pending is not None and not pending.done():
+                        await asyncio.wait([pending])
+                    await loop.run_in_executor(writer, f.close)
+                return size, hasher
+
+            async def handle(pdf_binary: aiohttp.ClientResponse):
+                if pdf_binary.status == 304:
+                    return {"status": "unchanged"}
+                if pdf_binary.status != 200:
+                    logging.warning(
+                        f"Couldn't access {halid} at {url}: HTTP {pdf_binary.status}"
+                    )
+                    status = (
+                        "rejected"
+                        if pdf_binary.status in _PERMANENT_STATUSES
+                        else "failed"
+                    )
+                    return {"status": status, "reason": f"HTTP {pdf_binary.status}"}
+                if (
+                    max_size is not None
+                    and pdf_binary.content_length is not None
+                    and pdf_binary.content_length > max_size
+                ):
+                    logging.warning(f"{halid} at {url} is too large.")
+                    return {"status": "rejected", "reason": "too large"}
+                size, hasher = await write(pdf_binary)
+                loop = asyncio.get_running_loop()
+                if max_size is not None and size > max_size:
+                    logging.warning(f"{halid} at {url} is too large.")
+                    await loop.run_in_executor(writer, os.remove, part_file)
+                    return {"status": "rejected", "reason": "too large"}
+                await loop.run_in_executor(writer, os.replace, part_file, pdf_file)
+                return {
+                    "status": "done",
+                    "size": size,
+                    "checksum": hasher.hexdigest(),
+                    "etag": pdf_binary.headers.get("ETag"),
+                    "last_modified": pdf_binary.headers.get("Last-Modified"),
+                }
+
+            try:
+                return halid, await client.fetch(url, handle, headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"Couldn't access {halid} at {url}")
+                if os.path.exists(part_file):
+                    os.remove(part_file)
+                return halid, {
+                    "status": "failed",
+                    "reason": f"{type(e).__name__}: {e}",
+                }
+
+        return http_get
+
+    @classmethod
+    async def _download(
+        cls,
+        response_dir: str,
+        pdf_dir: str,
+        num_chunks: int,
+        limit_per_host: int = 0,
+        keep_alive: bool = True,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        max_size: Optional[int] = None,
+        incremental: bool = False,
+        revalidate: bool = False,
+        max_retries: int = 5,
+        rate_limit: Optional[float] = None,
+        shard_layout: str = "flat",
+        shard_depth: int = 2,
+        num_writers: int = 4,
+    ):
+        """Download PDFs from URLs found in response_dir's documents.
+
+        Parameters
+        ----------
+        response_dir : str
+            Directory containing the fetched data from HAL in JSON files.
+        pdf_dir : str
+            Target directory to download the PDFs.
+        num_chunks : int
+            Number of semaphores.
+        limit_per_host : int, default=0
+            Maximum number of simultaneous connections to the same host. 0 means no
+            limit.
+        keep_alive : bool, default=True
+            If ``False``, each connection is closed after its request.
+        connect_timeout : float, optional
+            Timeout in seconds to establish a connection.
+        read_timeout : float, optional
+            Timeout in seconds between two reads of a response.
+        max_size : int, optional
+            PDFs larger than ``max_size`` bytes are not downloaded.
+        incremental : bool, default=False
+            If ``True``, PDFs already downloaded are skipped and only the failed or
+            new ones are requested. PDFs rejected for good (HTTP 404, too large)
+            are only requested again with ``revalidate``.
+        revalidate : bool, default=False
+            If ``True`` with ``incremental``, PDFs already downloaded are requested
+            again with conditional headers and only replaced if they changed, and
+            rejected PDFs are retried.
+        max_retries : int, default=5
+            Maximum number of retries of a PDF on connection errors, timeouts and
+            transient HTTP statuses.
+        rate_limit : float, optional
+            Maximum number of requests per second sent to the same host. No limit if
+            not given.
+        shard_layout : str, default="flat"
+            Layout of ``pdf_dir``: "flat" puts every PDF in ``pdf_dir``, "prefix"
+            and "hash" put them in sub-directories named after the first characters
+            of their halid or of its MD5 hash.
+        shard_depth : int, default=2
+            Number of nested sub-directories with a sharded layout.
+        num_writers : int, default=4
+            Number of threads writing the PDFs to disk.
+        """
+        urls = cls._get_urls(response_dir)
+        pdf_path = cls._pdf_path_builder(pdf_dir, shard_layout, shard_depth)
+        queue = asyncio.Queue(maxsize=_QUEUE_SIZE_PER_WORKER * num_chunks)
+
+        async with cls._session(
+            num_chunks, limit_per_host, keep_alive, connect_timeout, read_timeout
+        ) as client_session:
+            client = RetryClient(
+                client_session, max_retries=max_retries, rate_limit=rate_limit
+            )
+            ledger_path = os.path.join(check_dir(pdf_dir), _LEDGER_FILE)
+            with ThreadPoolExecutor(num_writers) as writer, ThreadPoolExecutor(
+                1
+            ) as recorder, Ledger(ledger_path) as ledger, tqdm() as progress:
+                http_client = cls._chunked_http_client(writer, max_size)
+                await asyncio.gather(
+                    cls._feed(queue, urls, num_chunks),
+                    *(
+                        cls._worker(
+                            queue,
+                            http_client,
+                            client,
+                            pdf_path,
+                            progress,
+                            ledger,
+                            recorder,
+                            incremental,
+                            revalidate,
+                        )
+                        for _ in range(num_chunks)
+                    ),
+                )
+
+    @classmethod
+    async def _feed(
+        cls, queue: asyncio.Queue, urls: Iterator[Tuple[str, str]], num_workers: int
+    ):
+        """Lazily puts the URLs in the queue, then one stop signal per worker.
+
+        Parameters
+        ----------
+        queue : asyncio.Queue
+            Bounded queue shared with the workers.
+        urls : Iterator[Tuple[str, str]]
+            halids and PDF URLs returned by ``cls._get_urls``.
+        num_workers : int
+            Number of workers pulling from the queue.
+        """
+        for halid, url in urls:
+            await queue.put((halid, url))
+        for _ in range(num_workers):
+            await queue.put(None)
+
+    @classmethod
+    async def _worker(
+        cls,
+        queue: asyncio.Queue,
+        http_client: Callable,
+        client: RetryClient,
+        pdf_path: Callable[[str], str],
+        progress: tqdm,
+        ledger: Ledger,
+        recorder: ThreadPoolExecutor,
+        incremental: bool = False,
+        revalidate: bool = False,
+    ):
+        """Downloads the PDFs pulled from the queue until the stop signal and
+        records each download in the ledger.
+
+        Parameters
+        ----------
+        queue : asyncio.Queue
+            Bounded queue containing halids and PDF URLs.
+        http_client : Callable
+            Requester returned by ``cls._chunked_http_client``.
+        client : halvesting.services.http_client.RetryClient
+            Client used to get data.
+        pdf_path : Callable[[str], str]
+            Function returned by ``cls._pdf_path_builder``.
+        progress : tqdm.tqdm
+            Progress bar updated after each download.
+        ledger : halvesting.utils.data.Ledger
+            Ledger of the downloads.
+        recorder : concurrent.futures.ThreadPoolExecutor
+            Single thread reading and writing ``ledger``.
+        incremental : bool, default=False
+            If ``True``, PDFs already downloaded and PDFs rejected for good are
+            skipped.
+        revalidate : bool, default=False
+            If ``True`` with ``incremental``, PDFs already downloaded are requested
+            again with conditional headers, and rejected PDFs are retried.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+
+            if item is None:
+                break
+
+            halid, url = item
+            pdf_file = pdf_path(halid)
+            headers = None
+            entry = None
+            if incremental:
+                entry = await loop.run_in_executor(recorder, ledger.get, halid)
+            if (
+                entry is not None
+                and entry["status"] == "rejected"
+                and entry["url"] == url
+                and not revalidate
+            ):
+                progress.update()
+                continue
+            if incremental and os.path.isfile(pdf_file):
+                if not revalidate or entry is None or entry["url"] != url:
+                    progress.update()
+                    continue
+                headers = {}
+                if entry["etag"] is not None:
+                    headers["If-None-Match"] = entry["etag"]
+                if entry["last_modified"] is not None:
+                    headers["If-Modified-Since"] = entry["last_modified"]
+
+            halid, result = await http_client(halid, url, client, pdf_file, headers)
+            progress.update()
+            if result["status"] != "unchanged":
+                await loop.run_in_executor(
+                    recorder, functools.partial(ledger.update, halid, url, **result)
+                )
+
+            if result["status"] != "done":
+                continue
+
+            logging.info(pdf_file)
+
+    @classmethod
+    def download(
+        cls,
+        response_dir: str,
+        pdf_dir: str,
+        num_chunks: int,
+        limit_per_host: int = 0,
+        keep_alive: bool = True,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        max_size: Optional[int] = None,
+        incremental: bool = False,
+        revalidate: bool = False,
+        max_retries: int = 5,
+        rate_limit: Optional[float] = None,
+        shard_layout: str = "flat",
+        shard_depth: int = 2,
+        num_writers: int = 4,
+    ):
+        """Download PDFs from URLs found in response_dir's documents.
+
+        Parameters
+        ----------
+        response_dir: str
+            Directory containing the fetched data from HAL in JSON files.
+        pdf_dir: str
+            Target directory to download the PDFs.
+        num_chunks: int
+            Number of semaphores.
+        limit_per_host: int, default=0
+            Maximum number of simultaneous connections to the same host. 0 means no
+            limit.
+        keep_alive: bool, default=True
+            If ``False``, each connection is closed after its request.
+        connect_timeout: float, optional
+            Timeout in seconds to establish a connection.
+        read_timeout: float, optional
+            Timeout in seconds between two reads of a response.
+        max_size: int, optional
+            PDFs larger than ``max_size`` bytes are not downloaded.
+        incremental: bool, default=False
+            If ``True``, PDFs already downloaded are skipped and only the failed or
+            new ones are requested. PDFs rejected for good (HTTP 404, too large)
+            are only requested again with ``revalidate``.
+        revalidate: bool, default=False
+            If ``True`` with ``incremental``, PDFs already downloaded are requested
+            again with conditional headers and only replaced if they changed, and
+            rejected PDFs are retried.
+        max_retries: int, default=5
+            Maximum number of retries of a PDF on connection errors, timeouts and
+            transient HTTP statuses.
+        rate_limit: float, optional
+            Maximum number of requests per second sent to the same host. No limit if
+            not given.
+        shard_layout: str, default="flat"
+            Layout of ``pdf_dir``: "flat" puts every PDF in ``pdf_dir``, "prefix"
+            and "hash" put them in sub-directories named after the first characters
+            of their halid or of its MD5 hash.
+        shard_depth: int, default=2
+            Number of nested sub-directories with a sharded layout.
+        num_writers: int, default=4
+            Number of threads writing the PDFs to disk.
+        """
+        if pdf_dir is None:
+            raise TypeError("``pdf_dir`` expected ``str`` but got ``None``")
+        if num_chunks is None:
+            raise TypeError("``num_chunks`` expected ``int`` but got ``None``")
+
+        loop = asyncio.get_event_loop()
+        start = time.time()
+        loop.run_until_complete(
+            cls._download(
+                response_dir,
+                pdf_dir,
+                num_chunks,
+                limit_per_host=limit_per_host,
+                keep_alive=keep_alive,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                max_size=max_size,
+                incremental=incremental,
+                revalidate=revalidate,
+                max_retries=max_retries,
+                rate_limit=rate_limit,
+                shard_layout=shard_layout,
+                shard_depth=shard_depth,
+                num_writers=num_writers,
+            )
+        )
+        end = time.time()
+        logging.info(f"Time: {end - start}")
@@ -1,6 +1,6 @@
 # halvesting/services/enrisher.py
 
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 from kenlm import Model
 from sentencepiece import SentencePieceProcessor
@@ -8,6 +8,85 @@ from transformers import AutoModel
 
 from halvesting.utils.data import Postprocessing
 
+# Models needed by the signals of ``Postprocessing`` that depend on one
+_SIGNAL_MODELS: Dict[str, Tuple[str, ...]] = {
+    "token_count": ("tokenizer",),
+    "kenlm_pp": ("sentencepiece", "kenlm"),
+}
+# Signals computed by ``enrich``, in the order of the output columns, with the
+# models each of them needs
+SIGNALS: Dict[str, Tuple[str, ...]] = {
+    signal: _SIGNAL_MODELS.get(signal, ()) for signal in Postprocessing.SIGNALS
+}
+# Named sets of signals
+SIGNAL_SETS: Dict[str, Tuple[str, ...]] = {
+    "all": tuple(SIGNALS),
+    # Signals used by ``halvesting.services.filter_``
+    "filter": (
+        "token_count",
+        "rps_doc_frac_all_caps_words",
+        "rps_doc_frac_no_alph_words",
+        "rps_doc_lorem_ipsum",
+        "rps_doc_mean_word_length",
+        "rps_doc_stop_word_fraction",
+        "rps_doc_word_count",
+    ),
+}
+
+
+def resolve_signals(names: Optional[Iterable[str]] = None):
+    """Expands the named sets of signals and checks the names of the signals.
+
+    Parameters
+    ----------
+    names: Iterable[str], optional
+        Names of signals or of sets of signals ("all", "filter"). Every signal by
+        default.
+
+    Returns
+    -------
+    signals: Tuple[str, ...]
+        Names of the signals, in the order of the output columns.
+
+    Raises
+    ------
+    ValueError
+        If a name is neither a signal nor a set of signals.
+    """
+    if names is None:
+        return SIGNAL_SETS["all"]
+    requested = set()
+    for name in names:
+        if name in SIGNAL_SETS:
+            requested.update(SIGNAL_SETS[name])
+        elif name in SIGNALS:
+            requested.add(name)
+        else:
+            raise ValueError(
+                f"Unknown signal {name}. Expected one of {', '.join(SIGNAL_SETS)} or "
+                f"{', '.join(SIGNALS)}."
+            )
+    return tuple(signal for signal in SIGNALS if signal in requested)
+
+
+def required_models(signals: Iterable[str]):
+    """Lists the models needed to compute some signals.
+
+    Parameters
+    ----------
+    signals: Iterable[str]
+        Names of the signals.
+
+    Returns
+    -------
+    models: Set[str]
+        Among "tokenizer", "sentencepiece" and "kenlm".
+    """
+    models: Set[str] = set()
+    for signal in signals:
+        models.update(SIGNALS[signal])
+    return models
+
 
 def enrich(
     documents: Dict[str, List[Any]],
@@ -15,9 +94,11 @@ def enrich(
     kenlm_model: Union[Model, None],
     lang: str,
     tokenizer: Optional[AutoModel] = None,
+    signals: Optional[Iterable[str]] = None,
 ):
     """Computes some statistics on a batch of documents. The documents need to
-    follow the HALvesting's `json` format.
+    follow the HALvesting's `json` format. See
+    ``halvesting.utils.data.Postprocessing.score_batch``.
 
     Parameters
     ----------
@@ -32,100 +113,22 @@ def enrich(
     tokenizer: transformers.AutoModel, optional
         Custom HuggingFace tokenizer's checkpoint. Can also be the path to
         a local checkpoint.
+    signals: Iterable[str], optional
+        Names of the signals to compute, see ``resolve_signals``. Every signal by
+        default. Only the selected signals are added to the documents.
 
     Returns
     -------
     documents: Dict[str, List[Any]]
         The enrished batch of documents.
     """
-    texts = []
-    token_count = []
-    rps_doc_frac_all_caps_words = []
-    rps_doc_frac_lines_end_with_ellipsis = []
-    rps_doc_frac_no_alph_words = []
-    rps_doc_lorem_ipsum = []
-    rps_doc_mean_word_length = []
-    rps_doc_stop_word_fraction = []
-    rps_doc_symbol_to_word_ratio = []
-    rps_doc_frac_unique_words = []
-    rps_doc_unigram_entropy = []
-    rps_doc_word_count = []
-    doc_frac_lines_ending_with_terminal_punctution_mark = []
-    rps_lines_frac_start_with_bulletpoint = []
-    rps_doc_num_sentences = []
-    rps_frac_chars_in_dupe_5grams = []
-    rps_frac_chars_in_dupe_6grams = []
-    rps_frac_chars_in_dupe_7grams = []
-    rps_frac_chars_in_dupe_8grams = []
-    rps_frac_chars_in_dupe_9grams = []
-    rps_frac_chars_in_dupe_10grams = []
-    kenlm_pp = []
-
-    for text in documents["text"]:
-        document = Postprocessing(text=text, lang=lang, tokenizer=tokenizer)
-        texts.append(document.raw_content)
-        token_count.append(document.count_tokens())
-        rps_doc_frac_all_caps_words.append(document.rps_doc_frac_all_caps_words())
-        rps_doc_frac_lines_end_with_ellipsis.append(
-            document.rps_doc_frac_lines_end_with_ellipsis()
-        )
-        rps_doc_frac_no_alph_words.append(document.rps_doc_frac_no_alph_words())
-        rps_doc_lorem_ipsum.append(document.rps_doc_lorem_ipsum())
-        rps_doc_mean_word_length.append(document.rps_doc_mean_word_length())
-        rps_doc_stop_word_fraction.append(document.rps_doc_stop_word_fraction())
-        rps_doc_symbol_to_word_ratio.append(document.rps_doc_symbol_to_word_ratio())
-        rps_doc_frac_unique_words.append(document.rps_doc_frac_unique_words())
-        rps_doc_unigram_entropy.append(document.rps_doc_unigram_entropy())
-        rps_doc_word_count.append(document.rps_doc_word_count())
-        doc_frac_lines_ending_with_terminal_punctution_mark.append(
-            document.doc_frac_lines_ending_with_terminal_punctution_mark()
-        )
-        rps_lines_frac_start_with_bulletpoint.append(
-            document.rps_lines_frac_start_with_bulletpoint()
-        )
-        rps_doc_num_sentences.append(document.rps_doc_num_sentences())
-        rps_frac_chars_in_dupe_5grams.append(document.rps_frac_chars_in_dupe_ngrams(5))
-        rps_frac_chars_in_dupe_6grams.append(document.rps_frac_chars_in_dupe_ngrams(6))
-        rps_frac_chars_in_dupe_7grams.append(document.rps_frac_chars_in_dupe_ngrams(7))
-        rps_frac_chars_in_dupe_8grams.append(document.rps_frac_chars_in_dupe_ngrams(8))
-        rps_frac_chars_in_dupe_9grams.append(document.rps_frac_chars_in_dupe_ngrams(9))
-        rps_frac_chars_in_dupe_10grams.append(
-            document.rps_frac_chars_in_dupe_ngrams(10)
-        )
-        if (sentencepiece_model or kenlm_model) is None:
-            kenlm_pp.append(None)
-        else:
-            kenlm_pp.append(
-                document.compute_perplexity(sentencepiece_model, kenlm_model)  # type: ignore
-            )
-
-    documents["text"] = texts
-    documents["token_count"] = token_count
-    documents["rps_doc_frac_all_caps_words"] = rps_doc_frac_all_caps_words
-    documents["rps_doc_frac_lines_end_with_ellipsis"] = (
-        rps_doc_frac_lines_end_with_ellipsis
+    columns = Postprocessing.score_batch(
+        documents["text"],
+        lang,
+        tokenizer=tokenizer,
+        sentencepiece_model=sentencepiece_model,
+        kenlm_model=kenlm_model,
+        signals=resolve_signals(signals),
     )
-    documents["rps_doc_frac_no_alph_words"] = rps_doc_frac_no_alph_words
-    documents["rps_doc_lorem_ipsum"] = rps_doc_lorem_ipsum
-    documents["rps_doc_mean_word_length"] = rps_doc_mean_word_length
-    documents["rps_doc_stop_word_fraction"] = rps_doc_stop_word_fraction
-    documents["rps_doc_symbol_to_word_ratio"] = rps_doc_symbol_to_word_ratio
-    documents["rps_doc_frac_unique_words"] = rps_doc_frac_unique_words
-    documents["rps_doc_unigram_entropy"] = rps_doc_unigram_entropy
-    documents["rps_doc_word_count"] = rps_doc_word_count
-    documents["doc_frac_lines_ending_with_terminal_punctution_mark"] = (
-        doc_frac_lines_ending_with_terminal_punctution_mark
-    )
-    documents["rps_lines_frac_start_with_bulletpoint"] = (
-        rps_lines_frac_start_with_bulletpoint
-    )
-    documents["rps_doc_num_sentences"] = rps_doc_num_sentences
-    documents["rps_frac_chars_in_dupe_5grams"] = rps_frac_chars_in_dupe_5grams
-    documents["rps_frac_chars_in_dupe_6grams"] = rps_frac_chars_in_dupe_6grams
-    documents["rps_frac_chars_in_dupe_7grams"] = rps_frac_chars_in_dupe_7grams
-    documents["rps_frac_chars_in_dupe_8grams"] = rps_frac_chars_in_dupe_8grams
-    documents["rps_frac_chars_in_dupe_9grams"] = rps_frac_chars_in_dupe_9grams
-    documents["rps_frac_chars_in_dupe_10grams"] = rps_frac_chars_in_dupe_10grams
-    documents["kenlm_pp"] = kenlm_pp
-
+    documents.update(columns)
     return documents
@@ -0,0 +1,218 @@
+# halvesting/services/http_client.py
+
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from urllib import parse
+
+import aiohttp
+
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+_RETRY_EXCEPTIONS = (
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+    asyncio.TimeoutError,
+)
+
+T = TypeVar("T")
+
+
+class _TokenBucket:
+    """Token bucket limiting the rate of requests sent to a single host.
+
+    Parameters
+    ----------
+    rate: float, optional
+        Number of requests allowed per second. No limit if not given: the bucket
+        then only holds the requests back while the host is paused.
+    burst: int
+        Maximum number of requests sent at once after an idle period.
+    """
+
+    def __init__(self, rate: Optional[float], burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.not_before = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Waits until a request can be sent."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.not_before:
+                    await asyncio.sleep(self.not_before - now)
+                    continue
+                if self.rate is None:
+                    return
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, delay: float):
+        """Prevents any request from being sent during ``delay`` seconds.
+
+        Parameters
+        ----------
+        delay: float
+            Number of seconds to wait.
+        """
+        self.not_before = max(self.not_before, time.monotonic() + delay)
+
+
+class RetryClient:
+    """Wraps an ``aiohttp.ClientSession`` to retry transient failures with a
+    jittered exponential backoff and to limit the rate of requests per host.
+
+    Parameters
+    ----------
+    session: aiohttp.ClientSession
+        Session used to send the requests.
+    max_retries: int, default=5
+        Maximum number of retries of a request.
+    backoff: float, default=1.0
+        Base delay in seconds between two attempts, doubled after each failure.
+    max_backoff: float, default=60.0
+        Maximum delay in seconds between two attempts.
+    rate_limit: float, optional
+        Maximum number of requests per second sent to the same host. No limit if not
+        given.
+    burst: int, default=1
+        Maximum number of requests sent at once to the same host after an idle
+        period.
+
+    Notes
+    -----
+    Connection errors, timeouts, truncated bodies and the HTTP statuses 429, 500,
+    502, 503 and 504 are retried. When the server sends a ``Retry-After`` header,
+    the whole host is paused for the requested time, with or without
+    ``rate_limit``. The retry is done with "full jitter": the delay is drawn
+    uniformly between 0 and the current backoff.
+
+    Examples
+    --------
+    >>> async with aiohttp.ClientSession() as session:
+    ...     client = RetryClient(session, rate_limit=10)
+    ...     data = await client.fetch(url, lambda response: response.read())
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        rate_limit: Optional[float] = None,
+        burst: int = 1,
+    ):
+        self.session = session
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self._buckets: Dict[str, _TokenBucket] = defaultdict(
+            lambda: _TokenBucket(self.rate_limit, self.burst)
+        )
+
+    def _delay(self, attempt: int):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    @staticmethod
+    def _retry_after(response: aiohttp.ClientResponse):
+        """Reads the ``Retry-After`` header of a response.
+
+        Parameters
+        ----------
+        response: aiohttp.ClientResponse
+            Response of the server.
+
+        Returns
+        -------
+        delay: float | None
+            Number of seconds to wait, or ``None`` if the header is missing or
+            invalid.
+        """
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, date.timestamp() - time.time())
+
+    async def fetch(
+        self,
+        url: str,
+        handler: Callable[[aiohttp.ClientResponse], Awaitable[T]],
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        """Sends a GET request and processes the response with ``handler``. The
+        request and ``handler`` are tried again on transient failures.
+
+        Parameters
+        ----------
+        url: str
+            Requested URL.
+        handler: Callable[[aiohttp.ClientResponse], Awaitable[T]]
+            Coroutine function consuming the response. It is called again from
+            scratch if reading the body fails.
+        headers: Dict[str, str], optional
+            Additional headers.
+
+        Returns
+        -------
+        result: T
+            Result of ``handler``. When the retries are exhausted on a transient
+            status, ``handler`` receives the last response.
+
+        Raises
+        ------
+        aiohttp.ClientError, asyncio.TimeoutError
+            If the retries are exhausted on a connection error or a timeout.
+        """
+        host = parse.urlsplit(url).netloc
+        attempt = 0
+        while True:
+            await self._buckets[host].acquire()
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    if (
+                        response.status not in _RETRY_STATUSES
+                        or attempt >= self.max_retries
+                    ):
+                        return await handler(response)
+                    delay = self._retry_after(response)
+                    reason = f"HTTP {response.status}"
+            except _RETRY_EXCEPTIONS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = None
+                reason = type(e).__name__
+
+            if delay is not None:
+                self._buckets[host].pause(delay)
+            else:
+                delay = self._delay(attempt)
+            attempt += 1
+            logging.info(
+                f"{reason} on {url}: retry {attempt}/{self.max_retries} in "
+                f"{delay:.1f}s."
+            )
+            await asyncio.sleep(delay)
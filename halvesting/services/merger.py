@@ -2,18 +2,86 @@
 
 import asyncio
 import glob
-import json
 import os
 import re
-import zipfile
-from collections import defaultdict
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
 
-import aiofiles
+from halvesting.utils import ParquetShardWriter, ShardWriter, check_dir
+from halvesting.utils.data import TextArchive, is_record_file, iter_records
 
-import halvesting.utils.utils as utils
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
 
 _NUM_DOC_PER_FILE = 2000
+_QUEUE_SIZE_PER_WORKER = 8
+_WRITE_BATCH_SIZE = 256
+_BLANK_RE = re.compile(r"^[\s\n]*$")
+_AUTHOR_FIELDS = ("name", "affiliations")
+
+
+def _parquet_schema():
+    """Schema of the Parquet shards. Every paper has the same fields, while the
+    identifiers of the authors (halauthorid, orcid, md5, ...) vary from one author
+    to another and are stored in a map.
+
+    Returns
+    -------
+    schema: pyarrow.Schema
+        Schema of the merged papers.
+    """
+    author = pa.struct(  # type: ignore
+        [
+            ("name", pa.string()),  # type: ignore
+            ("affiliations", pa.list_(pa.string())),  # type: ignore
+            ("ids", pa.map_(pa.string(), pa.string())),  # type: ignore
+        ]
+    )
+    return pa.schema(  # type: ignore
+        [
+            ("halid", pa.string()),  # type: ignore
+            ("lang", pa.string()),  # type: ignore
+            ("title", pa.string()),  # type: ignore
+            ("domain", pa.list_(pa.string())),  # type: ignore
+            ("timestamp", pa.string()),  # type: ignore
+            ("year", pa.string()),  # type: ignore
+            ("url", pa.string()),  # type: ignore
+            ("authors", pa.list_(author)),  # type: ignore
+            ("text", pa.string()),  # type: ignore
+        ]
+    )
+
+
+def _to_parquet_record(metadata: Dict[str, Any]):
+    """Moves the identifiers of each author to the ``ids`` map of the Parquet
+    schema.
+
+    Parameters
+    ----------
+    metadata: Dict[str, Any]
+        Metadata and full text of a paper.
+
+    Returns
+    -------
+    record: Dict[str, Any]
+        Record matching ``_parquet_schema``.
+    """
+    record = dict(metadata)
+    record["authors"] = [
+        {
+            "name": author.get("name"),
+            "affiliations": author.get("affiliations", []),
+            "ids": [
+                (key, value)
+                for key, value in author.items()
+                if key not in _AUTHOR_FIELDS and value is not None
+            ],
+        }
+        for author in metadata.get("authors", [])
+    ]
+    return record
 
 
 class Merger:
@@ -26,11 +94,24 @@ class Merger:
     js_dir_path: str
         Path to the folder containing the formatted response from the HAL's API.
     txts_dir_path: str
-        Path to the folder containing the fulltext of each paper in a TXT format.
+        Path to the fulltext of each paper in a TXT format: a zip archive, a
+        directory or uncompressed tar shards. See
+        ``halvesting.utils.data.TextArchive``.
     output_dir_path: str
         Path to the folder where the postprocessed data will be written into.
     version: str
         Version of the dump starting by "1.0".
+    num_workers: int, optional
+        Number of threads reading and decoding the full texts.
+    num_compressors: int, optional
+        Number of threads compressing the JSON lines files.
+    compression: str, optional
+        Compression of the JSON lines files: "gzip" or "zstd".
+    output_format: str, optional
+        Format of the shards: "jsonl" or "parquet". Parquet shards are compressed
+        with zstd and share the same schema.
+    row_group_size: int, optional
+        Number of papers in a Parquet row group.
 
     Attributes
     ----------
@@ -42,47 +123,151 @@ class Merger:
         Path to the folder where the postprocessed data will be written into.
     version: str
         Version of the dump starting by "1.0".
-    lang: defaultdict(lambda: defaultdict(int))
-        This dictionary stores each ISO 639 language code encountered on HAL and counts
-        the number of papers in a given language. Once the number of papers for a given
-        language reaches ``_DOC_PER_JS``, a new JSON lines file is written to disk,
-        compressed, and stored in the correct folder. A second counter is then
-        incremented to keep track of the number of JSON lines files for a given
-        language.
+    num_workers: int, default=4
+        Number of threads reading and decoding the full texts.
+    num_compressors: int, default=2
+        Number of threads compressing the JSON lines files.
+    compression: str, default="gzip"
+        Compression of the JSON lines files.
+    output_format: str, default="jsonl"
+        Format of the shards.
+    row_group_size: int, default=1000
+        Number of papers in a Parquet row group.
+    archive: halvesting.utils.data.TextArchive
+        Index of the full texts, opened once for the whole merge.
+
+    Notes
+    -----
+    The full texts are read by a pool of threads while the metadata are being
+    loaded. Each language streams its papers to a ``halvesting.utils.ShardWriter``,
+    which starts a new shard every ``_NUM_DOC_PER_FILE`` papers. Papers are sent to
+    the pool of compressing threads by batches of ``_WRITE_BATCH_SIZE`` per language,
+    and compressed while the next papers are being read.
     """
 
     def __init__(
-        self, js_dir_path: str, txts_dir_path: str, output_dir_path: str, version: str
+        self,
+        js_dir_path: str,
+        txts_dir_path: str,
+        output_dir_path: str,
+        version: str,
+        num_workers: Optional[int] = None,
+        num_compressors: Optional[int] = None,
+        compression: Optional[str] = None,
+        output_format: Optional[str] = None,
+        row_group_size: Optional[int] = None,
     ):
         self.js_dir_path = js_dir_path
         self.txts_dir_path = txts_dir_path
         self.output_dir_path = output_dir_path
         self.version = version
-        self.lang = defaultdict(lambda: defaultdict(int))
+        self.num_workers = num_workers if num_workers is not None else 4
+        self.num_compressors = num_compressors if num_compressors is not None else 2
+        self.compression = compression if compression is not None else "gzip"
+        self.output_format = output_format if output_format is not None else "jsonl"
+        self.row_group_size = row_group_size if row_group_size is not None else 1000
+        if self.output_format not in ("jsonl", "parquet"):
+            raise ValueError(
+                "``output_format`` expected 'jsonl' or 'parquet' but got "
+                f"{self.output_format}"
+            )
+        if self.output_format == "parquet" and pa is None:
+            raise ImportError("Writing Parquet shards requires `pip install pyarrow`.")
+        self.archive = None
+        self._writers: Dict[str, Union[ShardWriter, ParquetShardWriter]] = {}
+        self._batches: Dict[str, List[Dict[str, Any]]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
 
     def __call__(self):
         asyncio.run(self.postprocess())
 
-    async def _get_papers(self, queue: asyncio.Queue):
-        """Retrieves papers' metadata from JSON files asynchronously.
+    async def _get_papers(self, queue: asyncio.Queue, reader: ThreadPoolExecutor):
+        """Retrieves papers' metadata from `json`, `jsonl` or `jsonl.gz` files
+        and sends the reading of their full text to the workers.
 
         Parameters
         ----------
         queue : asyncio.Queue
-            Asynchronous queue to store papers' metadata.
+            Asynchronous queue to store papers' metadata and pending full texts.
+        reader : concurrent.futures.ThreadPoolExecutor
+            Pool of threads reading the full texts.
         """
+        loop = asyncio.get_running_loop()
         js_file_paths = os.listdir(self.js_dir_path)
         for js_file_path in js_file_paths:
+            if not is_record_file(js_file_path):
+                continue
             js_file_path = os.path.join(self.js_dir_path, js_file_path)
-            async with aiofiles.open(js_file_path, "r", encoding="utf-8") as f:
-                jsf = await f.read()
-                js = json.loads(jsf)
-            for metadata in js:
-                await queue.put(metadata)
+            for metadata in iter_records(js_file_path):
+                text = loop.run_in_executor(reader, self._read_txt, metadata["halid"])
+                await queue.put((metadata, text))
         await queue.put(None)
 
-    async def _append_metadata(self, metadata: Dict[str, str], lang: str):
-        """Appends metadata to JSON lines file.
+    def _get_writer(self, lang: str):
+        """Returns the shard writer of a language, creating its folder and
+        writer on first use.
+
+        Parameters
+        ----------
+        lang : str
+            ISO 639 language code.
+
+        Returns
+        -------
+        writer: Union[ShardWriter, ParquetShardWriter]
+            Shard writer of the language.
+        """
+        writer = self._writers.get(lang)
+        if writer is not None:
+            return writer
+        lang_dir_path = check_dir(os.path.join(self.output_dir_path, lang))
+        if self.output_format == "parquet":
+            writer = ParquetShardWriter(
+                lang_dir_path,
+                f"{lang}{self.version}",
+                schema=_parquet_schema(),
+                max_records=_NUM_DOC_PER_FILE,
+                row_group_size=self.row_group_size,
+            )
+        else:
+            writer = ShardWriter(
+                lang_dir_path,
+                f"{lang}{self.version}",
+                compression=self.compression,
+                max_records=_NUM_DOC_PER_FILE,
+            )
+        self._writers[lang] = writer
+        return writer
+
+    async def _write_batch(self, lang: str, compressor: ThreadPoolExecutor):
+        """Sends the batch of papers of a language to its shard writer. A
+        language is written by one thread at a time, but languages are compressed
+        concurrently.
+
+        Parameters
+        ----------
+        lang : str
+            ISO 639 language code.
+        compressor : concurrent.futures.ThreadPoolExecutor
+            Pool of threads compressing the JSON lines files.
+        """
+        batch = self._batches.pop(lang, None)
+        if not batch:
+            return
+        writer = self._get_writer(lang)
+        pending = self._pending.get(lang)
+        if pending is not None:
+            await pending
+        loop = asyncio.get_running_loop()
+        self._pending[lang] = loop.run_in_executor(
+            compressor, writer.write_records, batch
+        )
+
+    async def _append_metadata(
+        self, metadata: Dict[str, str], lang: str, compressor: ThreadPoolExecutor
+    ):
+        """Adds metadata to the batch of its language, and sends the batch to the
+        shard writer once full.
 
         Parameters
         ----------
@@ -90,72 +275,56 @@ class Merger:
             Metadata of the paper.
         lang : str
             ISO 639 language code.
+        compressor : concurrent.futures.ThreadPoolExecutor
+            Pool of threads compressing the JSON lines files.
         """
-        lang_dir_path = utils.check_dir(os.path.join(self.output_dir_path, lang))
-        output_file_path = os.path.join(
-            lang_dir_path, f"{lang}{self.version}-{self.lang[lang]['counter']}.jsonl"
-        )
-        async with aiofiles.open(output_file_path, "a") as f:
-            await f.write(json.dumps(metadata, ensure_ascii=False) + "\n")
+        if self.output_format == "parquet":
+            metadata = _to_parquet_record(metadata)
+        batch = self._batches.setdefault(lang, [])
+        batch.append(metadata)
+        if len(batch) >= _WRITE_BATCH_SIZE:
+            await self._write_batch(lang, compressor)
 
-    async def _format(self, queue: asyncio.Queue):
-        """Formats papers' metadata and full text asynchronously.
+    async def _format(self, queue: asyncio.Queue, compressor: ThreadPoolExecutor):
+        """Formats papers' metadata and full text asynchronously. Full texts are
+        awaited in the order the papers were read.
 
         Parameters
         ----------
         queue : asyncio.Queue
-            Asynchronous queue containing papers' metadata.
+            Asynchronous queue containing papers' metadata and pending full texts.
+        compressor : concurrent.futures.ThreadPoolExecutor
+            Pool of threads compressing the JSON lines files.
         """
+        loop = asyncio.get_running_loop()
         while True:
-            metadata = await queue.get()
+            item = await queue.get()
 
-            if metadata is None:
+            if item is None:
                 break
 
-            iso_code = metadata["lang"]
-            text = self._read_txt(metadata["halid"])
-
-            if not text:
-                continue
-
-            self.lang[iso_code]["nb_files"] += 1
+            metadata, text = item
+            str_text = await text
 
-            str_text = text.decode("utf-8")
-
-            # Empty files
-            if not str_text:
-                continue
-            pattern = re.compile(r"^[\s\n]*$")
-            if re.search(pattern, str_text):
+            if str_text is None:
                 continue
 
+            iso_code = metadata["lang"]
             metadata["text"] = str_text
-            await self._append_metadata(metadata, iso_code)
-
-            if self.lang[iso_code]["nb_files"] == _NUM_DOC_PER_FILE:
-                utils.compress(
-                    lang=iso_code,
-                    hf_dir_path=self.output_dir_path,
-                    counter=self.lang[iso_code]["counter"],
-                    version=self.version,
-                )
-                self.lang[iso_code]["counter"] += 1
-                self.lang[iso_code]["nb_files"] = 0
-        for iso_code in self.lang.keys():
-            try:
-                utils.compress(
-                    lang=iso_code,
-                    hf_dir_path=self.output_dir_path,
-                    counter=self.lang[iso_code]["counter"],
-                    version=self.version,
-                )
-                self.lang[iso_code]["counter"] += 1
-                self.lang[iso_code]["nb_files"] = 0
-            except FileNotFoundError:
-                continue
+            await self._append_metadata(metadata, iso_code, compressor)
+        for lang in list(self._batches):
+            await self._write_batch(lang, compressor)
+        await asyncio.gather(*self._pending.values())
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(compressor, writer.close)
+                for writer in self._writers.values()
+            )
+        )
 
     def _read_txt(self, halid: str):
-        """Reads full text from the TXT file.
+        """Reads and decodes the full text of a paper. Meant to be run in a
+        worker thread.
 
         Parameters
         ----------
@@ -164,21 +333,25 @@ class Merger:
 
         Returns
         -------
-        bytes
-            Full text of the paper in bytes format.
+        str
+            Full text of the paper, or ``None`` if it is missing or blank.
         """
-        with zipfile.ZipFile(self.txts_dir_path, "r", zipfile.ZIP_DEFLATED) as zf:
-            path = f"txts/{halid}.grobid.txt"
-            if path in zf.namelist():
-                with zf.open(f"txts/{halid}.grobid.txt", "r") as f:
-                    text = f.read()
-            else:
-                return None
-        return text
+        text = self.archive.read(halid)  # type: ignore
+        if not text:
+            return None
+        str_text = text.decode("utf-8")
+        if _BLANK_RE.search(str_text):
+            return None
+        return str_text
 
     async def postprocess(self):
         """Asynchronously computes the post-processing routine that gets the
         preprocessed responses from HAL with their fulltext and formats it in
         JSON lines files before compressing them."""
-        queue = asyncio.Queue()
-        await asyncio.gather(self._get_papers(queue), self._format(queue))
+        queue = asyncio.Queue(maxsize=_QUEUE_SIZE_PER_WORKER * self.num_workers)
+        with TextArchive(self.txts_dir_path) as self.archive, ThreadPoolExecutor(
+            self.num_workers
+        ) as reader, ThreadPoolExecutor(self.num_compressors) as compressor:
+            await asyncio.gather(
+                self._get_papers(queue, reader), self._format(queue, compressor)
+            )
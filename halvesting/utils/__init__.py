@@ -7,6 +7,11 @@ from halvesting.utils.kenlm_utils import (download_sentencepiece_kenlm_models,
                                           load_kenlm_model,
                                           load_sentencepiece_model, tokenize_)
 from halvesting.utils.logger import logging_config
+from halvesting.utils.model_registry import (clear_models, get_kenlm_model,
+                                             get_sentencepiece_model,
+                                             get_tokenizer)
+from halvesting.utils.shard_writer import (ParquetShardWriter, ShardWriter,
+                                           export_dataset)
 from halvesting.utils.helper import (DATA_ROOT, PROJECT_ROOT, WIDTH, check_dir,
                                     compress)
 
@@ -16,6 +21,9 @@ __all__ = [
     "DATA_ROOT",
     "check_dir",
     "compress",
+    "ShardWriter",
+    "ParquetShardWriter",
+    "export_dataset",
     "logging_config",
     "FetcherArgParse",
     "MergerArgParse",
@@ -26,4 +34,8 @@ __all__ = [
     "load_kenlm_model",
     "load_sentencepiece_model",
     "tokenize_",
+    "get_tokenizer",
+    "get_sentencepiece_model",
+    "get_kenlm_model",
+    "clear_models",
 ]
@@ -93,6 +93,156 @@ class FetcherArgParse:
             const=None,
             help="Number of semaphores for the PDF downloader.",
         )
+        parser.add_argument(
+            "--limit_per_host",
+            type=int,
+            default=0,
+            help="Maximum number of connections per host for the PDF downloader.",
+        )
+        parser.add_argument(
+            "--keep_alive",
+            type=_bool,
+            default=True,
+            help="Set to `false` to close the connections after each PDF.",
+        )
+        parser.add_argument(
+            "--connect_timeout",
+            type=float,
+            nargs="?",
+            const=None,
+            help="Timeout in seconds to connect to a host hosting a PDF.",
+        )
+        parser.add_argument(
+            "--read_timeout",
+            type=float,
+            nargs="?",
+            const=None,
+            help="Timeout in seconds between two reads of a PDF.",
+        )
+        parser.add_argument(
+            "--max_pdf_size",
+            type=int,
+            nargs="?",
+            const=None,
+            help="PDFs larger than this number of bytes are not downloaded.",
+        )
+        parser.add_argument(
+            "--incremental",
+            type=_bool,
+            default=False,
+            help=(
+                "Set to `true` to only download new PDFs and retry failed ones, "
+                "except the permanent failures (HTTP 404, too large)."
+            ),
+        )
+        parser.add_argument(
+            "--revalidate",
+            type=_bool,
+            default=False,
+            help="Set to `true` to re-download PDFs that changed since last time.",
+        )
+        parser.add_argument(
+            "--num_slices",
+            type=int,
+            default=1,
+            help="Number of date sub-ranges crawled concurrently on HAL.",
+        )
+        parser.add_argument(
+            "--max_concurrency",
+            type=int,
+            default=4,
+            help="Maximum number of concurrent requests sent to HAL's API.",
+        )
+        parser.add_argument(
+            "--resume",
+            type=_bool,
+            default=False,
+            help="Set to `true` to resume the crawl from the last checkpoint.",
+        )
+        parser.add_argument(
+            "--num_parsers",
+            type=int,
+            default=0,
+            help="Number of processes parsing HAL's responses (0 to parse in-loop).",
+        )
+        parser.add_argument(
+            "--parse_window",
+            type=int,
+            default=8,
+            help="Maximum number of downloaded pages waiting to be parsed.",
+        )
+        parser.add_argument(
+            "--queue_size",
+            type=int,
+            default=16,
+            help="Maximum number of pages queued between crawler and formatter.",
+        )
+        parser.add_argument(
+            "--output_format",
+            type=str,
+            default="json",
+            choices=["json", "jsonl"],
+            help="Format of the files storing the fetched data.",
+        )
+        parser.add_argument(
+            "--compress_output",
+            type=_bool,
+            default=False,
+            help="Set to `true` to gzip the JSON lines files.",
+        )
+        parser.add_argument(
+            "--max_file_bytes",
+            type=int,
+            nargs="?",
+            const=None,
+            help="Maximum size in bytes of a JSON lines file.",
+        )
+        parser.add_argument(
+            "--run_id",
+            type=str,
+            nargs="?",
+            const=None,
+            help="Identifier of the run used to name its files. Random by default.",
+        )
+        parser.add_argument(
+            "--max_retries",
+            type=int,
+            default=5,
+            help="Maximum number of retries of a request to HAL or to a PDF.",
+        )
+        parser.add_argument(
+            "--api_rate_limit",
+            type=float,
+            nargs="?",
+            const=None,
+            help="Maximum number of requests per second sent to HAL's API.",
+        )
+        parser.add_argument(
+            "--pdf_rate_limit",
+            type=float,
+            nargs="?",
+            const=None,
+            help="Maximum number of requests per second sent to a host of PDFs.",
+        )
+        parser.add_argument(
+            "--shard_layout",
+            type=str,
+            choices=["flat", "prefix", "hash"],
+            default="flat",
+            help="Layout of the PDF directory.",
+        )
+        parser.add_argument(
+            "--shard_depth",
+            type=int,
+            default=2,
+            help="Number of nested sub-directories of a sharded PDF directory.",
+        )
+        parser.add_argument(
+            "--num_writers",
+            type=int,
+            default=4,
+            help="Number of threads writing the PDFs to disk.",
+        )
         args, _ = parser.parse_known_args()
         return args
 
@@ -120,7 +270,7 @@ class MergerArgParse:
             "--txts_dir_path",
             type=str,
             required=True,
-            help="Folder containing the txt files.",
+            help="Zip archive, folder or tar shards containing the txt files.",
         )
         parser.add_argument(
             "--output_dir_path",
@@ -134,6 +284,38 @@ class MergerArgParse:
             required=True,
             help="Version of the dump starting at '1.0'.",
         )
+        parser.add_argument(
+            "--num_workers",
+            type=int,
+            default=4,
+            help="Number of threads reading the txt files.",
+        )
+        parser.add_argument(
+            "--num_compressors",
+            type=int,
+            default=2,
+            help="Number of threads compressing the JSON lines files.",
+        )
+        parser.add_argument(
+            "--compression",
+            type=str,
+            choices=["gzip", "zstd"],
+            default="gzip",
+            help="Compression of the JSON lines files. `zstd` requires zstandard.",
+        )
+        parser.add_argument(
+            "--output_format",
+            type=str,
+            choices=["jsonl", "parquet"],
+            default="jsonl",
+            help="Format of the shards. Parquet shards are compressed with zstd.",
+        )
+        parser.add_argument(
+            "--row_group_size",
+            type=int,
+            default=1000,
+            help="Number of documents in a Parquet row group.",
+        )
         args, _ = parser.parse_known_args()
         return args
 
@@ -228,6 +410,33 @@ class EnricherArgParse:
             required=True,
             help="Version of the dump starting at '1.0'.",
         )
+        parser.add_argument(
+            "--compression",
+            type=str,
+            choices=["gzip", "zstd"],
+            default="gzip",
+            help="Compression of the JSON lines files. `zstd` requires zstandard.",
+        )
+        parser.add_argument(
+            "--output_format",
+            type=str,
+            choices=["jsonl", "parquet"],
+            default="jsonl",
+            help="Format of the shards. Parquet shards are compressed with zstd.",
+        )
+        parser.add_argument(
+            "--row_group_size",
+            type=int,
+            default=1000,
+            help="Number of documents in a Parquet row group.",
+        )
+        parser.add_argument(
+            "--signals",
+            type=str,
+            nargs="+",
+            default=["all"],
+            help="Signals to compute, or sets of signals: `all` or `filter`.",
+        )
         args, _ = parser.parse_known_args()
         return args
 
@@ -296,6 +505,26 @@ class FilteringArgParse:
             required=True,
             help="Version of the dump starting at '1.0'.",
         )
+        parser.add_argument(
+            "--compression",
+            type=str,
+            choices=["gzip", "zstd"],
+            default="gzip",
+            help="Compression of the JSON lines files. `zstd` requires zstandard.",
+        )
+        parser.add_argument(
+            "--output_format",
+            type=str,
+            choices=["jsonl", "parquet"],
+            default="jsonl",
+            help="Format of the shards. Parquet shards are compressed with zstd.",
+        )
+        parser.add_argument(
+            "--row_group_size",
+            type=int,
+            default=1000,
+            help="Number of documents in a Parquet row group.",
+        )
         args, _ = parser.parse_known_args()
         return args
 
@@ -1,11 +1,25 @@
 # halvesting/utils/data/__init__.py
 
-from halvesting.utils.data.flusher import Flusher
+from halvesting.utils.data.flusher import (Flusher, is_record_file, iter_records,
+                                           read_manifests)
+from halvesting.utils.data.ledger import Ledger
 from halvesting.utils.data.postprocessing import Postprocessing
-from halvesting.utils.data.preprocessing import format_hal
+from halvesting.utils.data.preprocessing import (HALStreamParser, format_biblfull,
+                                                  format_hal, format_hal_page,
+                                                  read_hal_header)
+from halvesting.utils.data.text_archive import TextArchive
 
 __all__ = [
     "format_hal",
+    "format_biblfull",
+    "format_hal_page",
+    "read_hal_header",
+    "HALStreamParser",
     "Flusher",
+    "Ledger",
+    "is_record_file",
+    "iter_records",
+    "read_manifests",
+    "TextArchive",
     "Postprocessing",
 ]
@@ -1,9 +1,79 @@
 # halvesting/utils/data/flusher.py
 
+import glob
+import gzip
 import json
 import os
+import uuid
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+
+_RECORD_EXTENSIONS = (".json", ".jsonl", ".jsonl.gz")
+_MANIFEST_EXTENSION = ".manifest"
+
+
+def is_record_file(path: str):
+    """Checks if a file has been written by a ``Flusher``.
+
+    Parameters
+    ----------
+    path: str
+        Path to the file.
+
+    Returns
+    -------
+    bool
+        ``True`` if the file contains records.
+    """
+    return path.endswith(_RECORD_EXTENSIONS)
+
+
+def iter_records(path: str):
+    """Reads the records of a file written by a ``Flusher``. JSON lines files,
+    compressed or not, are streamed line by line.
+
+    Parameters
+    ----------
+    path: str
+        Path to a `json`, `jsonl` or `jsonl.gz` file.
+
+    Yields
+    ------
+    Dict[str, Any]
+        Record.
+    """
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as jsf:
+            yield from json.load(jsf)
+        return
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as jsf:
+        for line in jsf:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_manifests(dir: str):
+    """Reads the manifests written by every ``Flusher`` in a directory.
+
+    Parameters
+    ----------
+    dir: str
+        Directory containing the files written by the ``Flusher``.
+
+    Yields
+    ------
+    Dict[str, Any]
+        Description of a file: its name, number of records, size in bytes and its
+        first and last halids in lexicographic order.
+    """
+    manifest_paths = glob.glob(os.path.join(dir, f"*{_MANIFEST_EXTENSION}"))
+    for manifest_path in sorted(manifest_paths):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
 
 
 class Flusher:
@@ -15,6 +85,20 @@ class Flusher:
         Maximum batch size to keep in the buffer before writing to disk.
     name: str
         File to write into.
+    counter: int, default=1
+        Index of the first file to write. Used to resume a crawl without overwriting
+        the files already on disk.
+    output_format: str, default="json"
+        Either "json", to write each batch as a single JSON array, or "jsonl", to
+        stream every data point to a JSON lines file as soon as it is saved.
+    compress: bool, default=False
+        If ``True``, JSON lines files are compressed with gzip.
+    max_bytes: int, optional
+        Maximum size in bytes of a JSON lines file on disk before starting a new one.
+    run_id: str, optional
+        Identifier of the run, randomly generated if not given. Files are named
+        `{date}_{run_id}_{counter}` so that several ``Flusher`` never overwrite each
+        other's files in the same directory.
 
     Attributes
     ----------
@@ -22,21 +106,112 @@ class Flusher:
         Maximum batch size to keep in the buffer before writing to disk.
     name: str
         File to write into.
+    counter: int
+        Index of the next file to write.
     batch: List[Dict[str, Any]]
         List containing each data point.
+    num_records: int
+        Number of data points in the JSON lines file being written.
+    run_id: str
+        Identifier of the run.
+    manifest_path: str
+        Path to the manifest of the run. Each complete file is described by a line
+        giving its number of records, size in bytes and halid range.
+
+    Notes
+    -----
+    Files are first written with a `.tmp` suffix and renamed once complete, so that
+    partial files are never visible to the readers.
     """
 
-    def __init__(self, dir: str, batch_size: int):
+    def __init__(
+        self,
+        dir: str,
+        batch_size: int,
+        counter: int = 1,
+        output_format: str = "json",
+        compress: bool = False,
+        max_bytes: Optional[int] = None,
+        run_id: Optional[str] = None,
+    ):
+        if output_format not in ("json", "jsonl"):
+            raise ValueError(
+                f"``output_format`` expected 'json' or 'jsonl' but got {output_format}"
+            )
         self.batch_size = batch_size
         self.dir = dir
-        self.counter = 1
+        self.counter = counter
+        self.output_format = output_format
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.run_id = run_id if run_id is not None else uuid.uuid4().hex[:8]
+        self.manifest_path = os.path.join(dir, f"{self.run_id}{_MANIFEST_EXTENSION}")
         self.batch = []
+        self.num_records = 0
+        self._raw = None
+        self._file = None
+        self._path = None
+        self._halids = []
 
     def __enter__(self):
         return self
 
-    def __exit__(self, *args, **kwargs):
-        self.flush()
+    def __exit__(self, exc_type, exc_value, traceback):
+        # On failure, the buffered records are dropped rather than written: the
+        # caller has not checkpointed them yet and would fetch them again.
+        if exc_type is None:
+            self.flush()
+        else:
+            self._discard()
+
+    def _discard(self):
+        """Drops the buffered data points and the incomplete JSON lines file."""
+        if self._file is not None:
+            if self._file is not self._raw:
+                self._file.close()
+            self._raw.close()  # type: ignore
+            os.remove(f"{self._path}.tmp")
+        self._halids = []
+        self._raw = None
+        self._file = None
+        self.num_records = 0
+        self.batch.clear()
+
+    @property
+    def num_pending(self):
+        """Number of data points saved but not yet in a complete file."""
+        return len(self.batch) + self.num_records
+
+    def _file_path(self, extension: str):
+        now = datetime.now()
+        now_s = now.strftime("%Y-%m-%d")
+        return os.path.join(
+            self.dir, f"{now_s}_{self.run_id}_{self.counter}{extension}"
+        )
+
+    def _update_manifest(self, path: str, num_records: int, halids: List[str]):
+        """Appends the description of a complete file to the manifest.
+
+        Parameters
+        ----------
+        path: str
+            Path to the complete file.
+        num_records: int
+            Number of records in the file.
+        halids: List[str]
+            halids of the records in the file.
+        """
+        entry = {
+            "file": os.path.basename(path),
+            "num_records": num_records,
+            "num_bytes": os.path.getsize(path),
+            "first_halid": min(halids) if halids else None,
+            "last_halid": max(halids) if halids else None,
+        }
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
 
     def save(self, data_point: List[Dict[str, Any]]):
         """Saves several data_points in the buffer. When the nnumber of data
@@ -47,18 +222,75 @@ class Flusher:
         data_point: List[Dict[str, Any]]
             Data point.
         """
+        if self.output_format == "jsonl":
+            self._write_lines(data_point)
+            if self._file is None:
+                return
+            size = self._raw.tell()  # type: ignore
+            if self.num_records >= self.batch_size or (
+                self.max_bytes is not None and size >= self.max_bytes
+            ):
+                self.flush()
+            return
         # self.batch.append(data_point)
         self.batch.extend(data_point)
         if len(self.batch) >= self.batch_size:
             self.flush()
 
+    def _write_lines(self, data_point: List[Dict[str, Any]]):
+        """Appends data points to the JSON lines file being written, opening a
+        new one if needed.
+
+        Parameters
+        ----------
+        data_point: List[Dict[str, Any]]
+            Data point.
+        """
+        if not data_point:
+            return
+        if self._file is None:
+            self._path = self._file_path(".jsonl.gz" if self.compress else ".jsonl")
+            self._raw = open(f"{self._path}.tmp", "wb")
+            self._file = (
+                gzip.GzipFile(fileobj=self._raw, mode="wb")
+                if self.compress
+                else self._raw
+            )
+        for record in data_point:
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            self._file.write(line.encode("utf-8"))
+            self._halids.append(record["halid"])
+        self.num_records += len(data_point)
+
     def flush(self):
         """Writes the data in ``self.batch`` to disk."""
-        now = datetime.now()
-        now_s = now.strftime("%Y-%m-%d")
-        js_file = os.path.join(self.dir, f"{now_s}_{self.counter}.json")
-        with open(js_file, "w") as f:
+        if self.output_format == "jsonl":
+            if self._file is None:
+                return
+            if self._file is not self._raw:
+                self._file.close()  # Writes the gzip trailer
+            self._raw.flush()  # type: ignore
+            os.fsync(self._raw.fileno())  # type: ignore
+            self._raw.close()  # type: ignore
+            os.replace(f"{self._path}.tmp", self._path)  # type: ignore
+            self._update_manifest(
+                self._path, self.num_records, self._halids  # type: ignore
+            )
+            self._halids = []
+            self._raw = None
+            self._file = None
+            self.num_records = 0
+            self.counter += 1
+            return
+
+        js_file = self._file_path(".json")
+        with open(f"{js_file}.tmp", "w") as f:
             json.dump(self.batch, f, ensure_ascii=False, indent=4)
             f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{js_file}.tmp", js_file)
+        self._update_manifest(
+            js_file, len(self.batch), [record["halid"] for record in self.batch]
+        )
         self.batch.clear()
         self.counter += 1
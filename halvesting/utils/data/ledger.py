@@ -0,0 +1,131 @@
+# halvesting/utils/data/ledger.py
+
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+_COLUMNS = (
+    "halid",
+    "url",
+    "status",
+    "size",
+    "checksum",
+    "etag",
+    "last_modified",
+    "reason",
+    "updated_at",
+)
+_COMMIT_EVERY = 100
+
+
+class Ledger:
+    """Keeps track of the downloaded PDFs in a SQLite database, so that a
+    download can be resumed without fetching the same files twice.
+
+    Parameters
+    ----------
+    path: str
+        Path to the SQLite database. Created if it does not exist.
+
+    Attributes
+    ----------
+    path: str
+        Path to the SQLite database.
+
+    Notes
+    -----
+    Each halid is mapped to the URL of its PDF, the status of the last download
+    ("done", "unchanged", "failed" or "rejected" for failures that retrying cannot
+    fix, such as an HTTP 404 or a PDF too large), the size and sha256 checksum of
+    the file, the ``ETag`` and ``Last-Modified`` headers returned by the server and
+    the reason of the last failure.
+
+    The connection can be used from another thread than the one that opened it, so
+    that the downloads are recorded off the event loop. It must then be used by a
+    single thread at a time.
+
+    Examples
+    --------
+    >>> from halvesting.utils.data import Ledger
+    >>> with Ledger("./data/pdfs/.ledger.sqlite") as ledger:
+    ...     ledger.update("02975689", url, status="done", size=1024)
+    ...     ledger.get("02975689")["status"]
+    'done'
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS downloads (
+                halid TEXT PRIMARY KEY,
+                url TEXT,
+                status TEXT,
+                size INTEGER,
+                checksum TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                reason TEXT,
+                updated_at TEXT
+            )"""
+        )
+        self._num_updates = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def get(self, halid: str):
+        """Gets the last recorded download of a PDF.
+
+        Parameters
+        ----------
+        halid: str
+            halid of the PDF.
+
+        Returns
+        -------
+        entry: Dict[str, Any] | None
+            Entry of the PDF, or ``None`` if it has never been downloaded.
+        """
+        row = self._connection.execute(
+            "SELECT * FROM downloads WHERE halid = ?", (halid,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def update(self, halid: str, url: str, **fields: Any):
+        """Records the result of a download. Fields that are not given keep
+        their previous value, except the failure reason which is reset.
+
+        Parameters
+        ----------
+        halid: str
+            halid of the PDF.
+        url: str
+            URL of the PDF.
+        fields: Any
+            Values of the other columns.
+        """
+        entry: Dict[str, Optional[Any]] = self.get(halid) or {}
+        entry.update({"reason": None})
+        entry.update(fields)
+        entry.update(
+            {"halid": halid, "url": url, "updated_at": datetime.now().isoformat()}
+        )
+        self._connection.execute(
+            f"INSERT OR REPLACE INTO downloads ({', '.join(_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+            tuple(entry.get(column) for column in _COLUMNS),
+        )
+        self._num_updates += 1
+        if self._num_updates % _COMMIT_EVERY == 0:
+            self._connection.commit()
+
+    def close(self):
+        """Commits the pending updates and closes the database."""
+        self._connection.commit()
+        self._connection.close()
@@ -8,20 +8,72 @@ import re
 import string
 import unicodedata
 from collections import Counter
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
 
 import ftfy
+import numpy as np
 from kenlm import Model
 from nltk.tokenize import WordPunctTokenizer
 from sentencepiece import SentencePieceProcessor
-from transformers import AutoTokenizer
 
-from halvesting.utils import DATA_ROOT, tokenize_
+from halvesting.utils import DATA_ROOT, get_tokenizer, tokenize_
 
 _PRECISION = 2
 _TRANSLATION_TABLE_PUNCTUATION = str.maketrans("", "", string.punctuation)
 _DIGITS_RE: re.Pattern = re.compile(r"\d")
+_ELLIPSIS_SYMBOLS = ("...", "…")
+_TERMINAL_PUNCTUATION_MARKS = (".", "!", "?", "”", '"', "。")
+_BULLET_POINT_SYMBOLS = (
+    "\u2022",  # bullet point
+    "\u2023",  # triangular bullet point
+    "\u25B6",  # black right pointing triangle
+    "\u25C0",  # black left pointing triangle
+    "\u25E6",  # white bullet point
+    "\u25A0",  # black square
+    "\u25A1",  # white square
+    "\u25AA",  # black small square
+    "\u25AB",  # white small square
+    "\u2013",  # en dash
+)
+_DUPE_NGRAM_SIZES = (5, 6, 7, 8, 9, 10)
+_RAW_WORDS_SIGNALS = ("rps_doc_frac_all_caps_words", "rps_doc_frac_no_alph_words")
+_RAW_LINES_SIGNALS = (
+    "rps_doc_frac_lines_end_with_ellipsis",
+    "doc_frac_lines_ending_with_terminal_punctution_mark",
+    "rps_lines_frac_start_with_bulletpoint",
+)
+_NORMALIZED_WORDS_SIGNALS = (
+    "rps_doc_mean_word_length",
+    "rps_doc_stop_word_fraction",
+    "rps_doc_frac_unique_words",
+    "rps_doc_unigram_entropy",
+    "rps_doc_word_count",
+)
+# Columns returned by ``Postprocessing.score_batch``, in order
+_SIGNALS = (
+    "token_count",
+    "rps_doc_frac_all_caps_words",
+    "rps_doc_frac_lines_end_with_ellipsis",
+    "rps_doc_frac_no_alph_words",
+    "rps_doc_lorem_ipsum",
+    "rps_doc_mean_word_length",
+    "rps_doc_stop_word_fraction",
+    "rps_doc_symbol_to_word_ratio",
+    "rps_doc_frac_unique_words",
+    "rps_doc_unigram_entropy",
+    "rps_doc_word_count",
+    "doc_frac_lines_ending_with_terminal_punctution_mark",
+    "rps_lines_frac_start_with_bulletpoint",
+    "rps_doc_num_sentences",
+    *(f"rps_frac_chars_in_dupe_{n}grams" for n in _DUPE_NGRAM_SIZES),
+    "kenlm_pp",
+)
 with open(os.path.join(DATA_ROOT, "stopwords.json"), "r", encoding="utf-8") as jsf:
-    _STOPWORDS = json.load(jsf)
+    # Hashed once per process: a lookup does not depend on the number of stop words
+    _STOPWORDS: Dict[str, FrozenSet[str]] = {
+        lang: frozenset(stop_words) for lang, stop_words in json.load(jsf).items()
+    }
+_UNSUPPORTED_LANGS: Set[str] = set()
 _COVER_TEXT_FR = (
     "L'archive ouverte pluridisciplinaire HAL, est destinée au dépôt et à la diffusion "
     "de documents scientifiques de niveau recherche, publiés ou non, émanant des "
@@ -45,6 +97,98 @@ _COVER_TEXT_EN_2 = (
 )
 
 
+def _extend_ngram_ids(prefix_ids: np.ndarray, size: int, suffix_ids: np.ndarray):
+    """Identifies the n-grams made of an n-gram of length ``size`` followed by
+    another n-gram.
+
+    Parameters
+    ----------
+    prefix_ids: np.ndarray
+        Identifier of the n-gram of length ``size`` starting at each position.
+    size: int
+        Length of the n-grams identified by ``prefix_ids``.
+    suffix_ids: np.ndarray
+        Identifier of the n-gram starting at each position.
+
+    Returns
+    -------
+    ids: np.ndarray
+        Identifier, between 0 and the number of unique n-grams, of the concatenated
+        n-gram starting at each position.
+    counts: np.ndarray
+        Number of occurrences of each identifier.
+    """
+    num_ngrams = min(len(prefix_ids), len(suffix_ids) - size)
+    keys = prefix_ids[:num_ngrams] * (int(suffix_ids.max()) + 1)
+    keys += suffix_ids[size : size + num_ngrams]
+    _, ids, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return ids.reshape(-1), counts
+
+
+def _count_dupe_ngrams(text: str, ns: Iterable[int]):
+    """Counts the characters n-grams of ``text`` occurring more than once, for
+    several sizes at once. Each n-gram is identified by an integer computed from
+    the identifiers of shorter n-grams, so that no n-gram is ever sliced out of
+    the text.
+
+    Parameters
+    ----------
+    text: str
+        The text to process.
+    ns: Iterable[int]
+        Sizes of n-grams, each at most ``len(text)``.
+
+    Returns
+    -------
+    dupes: Dict[int, int]
+        Number of positions starting a duplicated n-gram, for each size.
+    """
+    ns = sorted(set(ns))
+    dupes: Dict[int, int] = {}
+    if not ns:
+        return dupes
+    codepoints = np.frombuffer(
+        text.encode("utf-32-le", errors="surrogatepass"), dtype=np.uint32
+    )
+    _, char_ids, counts = np.unique(
+        codepoints, return_inverse=True, return_counts=True
+    )
+    char_ids = char_ids.reshape(-1).astype(np.int64)
+    # Doubles the size of the n-grams up to the smallest size, then adds one
+    # character at a time
+    ids, size = char_ids, 1
+    while size * 2 <= ns[0]:
+        ids, counts = _extend_ngram_ids(ids, size, ids)
+        size *= 2
+    for n in ns:
+        while size < n:
+            ids, counts = _extend_ngram_ids(ids, size, char_ids)
+            size += 1
+        dupes[n] = int(counts[counts > 1].sum())
+    return dupes
+
+
+def _get_stop_words(lang: str):
+    """Gets the stop words of a language, warning once per process if the
+    language is not supported.
+
+    Parameters
+    ----------
+    lang: str
+        ISO-636 language code.
+
+    Returns
+    -------
+    stop_words: FrozenSet[str] | None
+        Stop words of the language, or ``None`` if it is not supported.
+    """
+    stop_words = _STOPWORDS.get(lang)
+    if stop_words is None and lang not in _UNSUPPORTED_LANGS:
+        _UNSUPPORTED_LANGS.add(lang)
+        logging.warning(f"No stop words for language {lang}.")
+    return stop_words
+
+
 class Postprocessing:
     """Class used to postprocess text data. Contains functions to clean the
     texts, normalize them before running some statistics on them.
@@ -67,12 +211,15 @@ class Postprocessing:
         The raw text to be processed.
     lang: str
         ISO-636 language code of the text retrieved from HAL.
+    tokenizer : transformers.AutoTokenizer, optional
+        **HuggingFace** tokenizer used to count the tokens.
 
     Attributes
     ----------
     tokenizer : transformers.AutoTokenizer
         **HuggingFace** tokenizer used to tokenize the raw content. By default, the
-        tokenizer used is "google/mt5-base". The slow tokenizer from **HF** is the
+        tokenizer used is "google/mt5-base", loaded once per process by
+        ``halvesting.utils.get_tokenizer``. The slow tokenizer from **HF** is the
         preferred one as `the fast one can hang for a while on long sequences`_ .
     word_tokenizer : nltk.tokenize.WordPunctTokenizer
         Word-level tokenizer used to compute statistics.
@@ -98,6 +245,13 @@ class Postprocessing:
     num_normalized_words: int
         Length of `self.normalized_words`.
 
+    Notes
+    -----
+    ``raw_content``, ``raw_words``, ``raw_lines``, ``normalized_content`` and
+    ``normalized_words`` are computed the first time they are accessed, then cached.
+    Counting the tokens never splits the words, and computing the perplexity never
+    fixes the text.
+
     Examples
     --------
     >>> from halvesting.utils.data import Postprocessing
@@ -121,23 +275,73 @@ class Postprocessing:
     ..  _`the fast one can hang for a while on long sequences`: https://github.com/huggingface/transformers/issues/25873
     """
 
-    tokenizer = AutoTokenizer.from_pretrained("google/mt5-base", use_fast=False)
+    __slots__ = (
+        "lang",
+        "tokenizer",
+        "_text",
+        "_raw_content",
+        "_raw_words",
+        "_raw_lines",
+        "_normalized_content",
+        "_normalized_words",
+    )
     word_tokenizer = WordPunctTokenizer()
+    # Names of the signals computed by ``score``, in the order of the columns
+    SIGNALS: Tuple[str, ...] = _SIGNALS
 
-    def __init__(self, text: str, lang: str, **kwargs):
+    def __init__(self, text: str, lang: str, tokenizer: Optional[Any] = None):
         self.lang = lang
-        self.raw_content = self.fix_text(text)
-        self.raw_words = tuple(self.word_tokenizer.tokenize(self.raw_content))
-        self.num_raw_words = len(self.raw_words)
-        self.raw_lines = tuple(self.raw_content.split("\n"))
-        self.num_raw_lines = len(self.raw_lines)
-        self.normalized_content = self._normalize(text)
-        self.normalized_words = tuple(
-            self.word_tokenizer.tokenize(self.normalized_content)
-        )
-        self.num_normalized_words = len(self.normalized_words)
-        kwargs = {k: v for k, v in kwargs.items() if v is not None}
-        self.__dict__.update(kwargs)
+        self.tokenizer = tokenizer
+        self._text = text
+        self._raw_content: Optional[str] = None
+        self._raw_words: Optional[Tuple[str, ...]] = None
+        self._raw_lines: Optional[Tuple[str, ...]] = None
+        self._normalized_content: Optional[str] = None
+        self._normalized_words: Optional[Tuple[str, ...]] = None
+
+    @property
+    def raw_content(self):
+        if self._raw_content is None:
+            self._raw_content = self.fix_text(self._text)
+        return self._raw_content
+
+    @property
+    def raw_words(self):
+        if self._raw_words is None:
+            self._raw_words = tuple(self.word_tokenizer.tokenize(self.raw_content))
+        return self._raw_words
+
+    @property
+    def num_raw_words(self):
+        return len(self.raw_words)
+
+    @property
+    def raw_lines(self):
+        if self._raw_lines is None:
+            self._raw_lines = tuple(self.raw_content.split("\n"))
+        return self._raw_lines
+
+    @property
+    def num_raw_lines(self):
+        return len(self.raw_lines)
+
+    @property
+    def normalized_content(self):
+        if self._normalized_content is None:
+            self._normalized_content = self._normalize(self._text)
+        return self._normalized_content
+
+    @property
+    def normalized_words(self):
+        if self._normalized_words is None:
+            self._normalized_words = tuple(
+                self.word_tokenizer.tokenize(self.normalized_content)
+            )
+        return self._normalized_words
+
+    @property
+    def num_normalized_words(self):
+        return len(self.normalized_words)
 
     def count_tokens(self):
         """Tokenizes `self.raw_content` and count the number of tokens without
@@ -148,10 +352,12 @@ class Postprocessing:
         int
             The total number of tokens in the text.
         """
-        if self.num_raw_words == 0:
+        # Same as ``self.num_raw_words == 0``, without splitting the words
+        if not self.raw_content.strip():
             return None
 
-        return len(self.tokenizer.encode(self.raw_content, add_special_tokens=False))
+        tokenizer = self.tokenizer if self.tokenizer is not None else get_tokenizer()
+        return len(tokenizer.encode(self.raw_content, add_special_tokens=False))
 
     def rps_doc_frac_all_caps_words(self):
         """Calculates the fraction of words in all caps in the raw content.
@@ -177,13 +383,11 @@ class Postprocessing:
         score: float
             The fraction of lines ending with ellipsis.
         """
-        ellipsis_symbols = ("...", "…")
-
         if self.num_raw_lines == 0:
             return None
 
         score = (
-            sum(map(lambda x: x.endswith(ellipsis_symbols), self.raw_lines))
+            sum(map(lambda x: x.endswith(_ELLIPSIS_SYMBOLS), self.raw_lines))
             / self.num_raw_lines
         )
         score = round(score, _PRECISION)
@@ -263,16 +467,14 @@ class Postprocessing:
 
         ..  _`stopwords-json`: https://github.com/6/stopwords-json/tree/master
         """
-        try:
-            stop_words = _STOPWORDS[self.lang]
-        except KeyError:
-            logging.error(f"No stop words for language {self.lang}.")
+        stop_words = _get_stop_words(self.lang)
+        if stop_words is None:
             return None
 
         if self.num_normalized_words == 0:
             return None
 
-        num_stop_words = sum(map(lambda w: w in stop_words, self.normalized_words))
+        num_stop_words = sum(map(stop_words.__contains__, self.normalized_words))
 
         score = float(num_stop_words) / self.num_normalized_words
         score = round(score, _PRECISION)
@@ -370,13 +572,11 @@ class Postprocessing:
         score: float
             The ratio of lines ending with a punctuation mark.
         """
-        terminal_punctuation_marks = (".", "!", "?", "”", '"', "。")
-
         if self.num_raw_lines == 0:
             return None
 
         score = (
-            sum(map(lambda x: x.endswith(terminal_punctuation_marks), self.raw_lines))
+            sum(map(lambda x: x.endswith(_TERMINAL_PUNCTUATION_MARKS), self.raw_lines))
             / self.num_raw_lines
         )
         score = round(score, _PRECISION)
@@ -400,20 +600,8 @@ class Postprocessing:
         if self.num_raw_lines == 0:
             return None
 
-        bullet_point_symbols = (
-            "\u2022",  # bullet point
-            "\u2023",  # triangular bullet point
-            "\u25B6",  # black right pointing triangle
-            "\u25C0",  # black left pointing triangle
-            "\u25E6",  # white bullet point
-            "\u25A0",  # black square
-            "\u25A1",  # white square
-            "\u25AA",  # black small square
-            "\u25AB",  # white small square
-            "\u2013",  # en dash
-        )
         score = (
-            sum(map(lambda x: x.startswith(bullet_point_symbols), self.raw_lines))
+            sum(map(lambda x: x.startswith(_BULLET_POINT_SYMBOLS), self.raw_lines))
             / self.num_raw_lines
         )
         score = round(score, _PRECISION)
@@ -451,19 +639,234 @@ class Postprocessing:
         score: float
             The fraction of n-grams repeted throughout the document.
         """
-        if self.num_normalized_words < n:
-            return 0.0
+        return self.rps_frac_chars_in_dupe_ngrams_multi((n,))[n]
+
+    def rps_frac_chars_in_dupe_ngrams_multi(self, ns: Iterable[int]):
+        """Calculates the fraction of characters in duplicate N-grams for
+        several sizes in a single pass over the normalized content. See
+        ``rps_frac_chars_in_dupe_ngrams``.
 
-        ngrams = [
-            self.normalized_content[i : i + n]
-            for i in range(len(self.normalized_content) - n + 1)
+        Parameters
+        ----------
+        ns: Iterable[int]
+            Sizes of n-grams.
+
+        Returns
+        -------
+        scores: Dict[int, float]
+            The fraction of n-grams repeted throughout the document, for each size.
+        """
+        ns = set(ns)
+        scores = {n: 0.0 for n in ns if self.num_normalized_words < n}
+        dupes = _count_dupe_ngrams(
+            self.normalized_content, (n for n in ns if n not in scores)
+        )
+        for n, dedup_size in dupes.items():
+            ngrams_size = len(self.normalized_content) - n + 1
+            scores[n] = round(dedup_size / ngrams_size, _PRECISION)
+        return scores
+
+    def _raw_words_scores(self):
+        """Computes the scores on the raw words in a single pass. Each predicate
+        runs once per distinct word.
+
+        Returns
+        -------
+        scores: Dict[str, Optional[float]]
+            ``rps_doc_frac_all_caps_words`` and ``rps_doc_frac_no_alph_words``.
+        """
+        if self.num_raw_words == 0:
+            return dict.fromkeys(_RAW_WORDS_SIGNALS)
+
+        num_caps_words, num_alph_words = 0, 0
+        for word, count in Counter(self.raw_words).items():
+            if word.isupper():
+                num_caps_words += count
+            if word.isalpha():
+                num_alph_words += count
+        return {
+            "rps_doc_frac_all_caps_words": round(
+                num_caps_words / self.num_raw_words, _PRECISION
+            ),
+            "rps_doc_frac_no_alph_words": round(
+                1.0 - num_alph_words / self.num_raw_words, _PRECISION
+            ),
+        }
+
+    def _raw_lines_scores(self):
+        """Computes the scores on the raw lines in a single pass.
+
+        Returns
+        -------
+        scores: Dict[str, Optional[float]]
+            ``rps_doc_frac_lines_end_with_ellipsis``,
+            ``doc_frac_lines_ending_with_terminal_punctution_mark`` and
+            ``rps_lines_frac_start_with_bulletpoint``.
+        """
+        if self.num_raw_lines == 0:
+            return dict.fromkeys(_RAW_LINES_SIGNALS)
+
+        num_ellipsis, num_terminal, num_bullet = 0, 0, 0
+        for line in self.raw_lines:
+            num_ellipsis += line.endswith(_ELLIPSIS_SYMBOLS)
+            num_terminal += line.endswith(_TERMINAL_PUNCTUATION_MARKS)
+            num_bullet += line.startswith(_BULLET_POINT_SYMBOLS)
+        return {
+            key: round(num / self.num_raw_lines, _PRECISION)
+            for key, num in zip(
+                _RAW_LINES_SIGNALS, (num_ellipsis, num_terminal, num_bullet)
+            )
+        }
+
+    def _normalized_words_scores(self):
+        """Computes the scores on the normalized words from a single count of
+        the words. Each predicate runs once per distinct word.
+
+        Returns
+        -------
+        scores: Dict[str, Optional[float]]
+            ``rps_doc_mean_word_length``, ``rps_doc_stop_word_fraction``,
+            ``rps_doc_frac_unique_words``, ``rps_doc_unigram_entropy`` and
+            ``rps_doc_word_count``.
+        """
+        stop_words = _get_stop_words(self.lang)
+        scores: Dict[str, Any] = dict.fromkeys(_NORMALIZED_WORDS_SIGNALS)
+        scores["rps_doc_word_count"] = self.num_normalized_words
+        if self.num_normalized_words == 0:
+            return scores
+
+        counter = Counter(self.normalized_words)
+        total = sum(counter.values())
+        num_chars, num_stop_words, entropy = 0, 0, 0.0
+        for word, count in counter.items():
+            num_chars += len(word) * count
+            if stop_words is not None and word in stop_words:
+                num_stop_words += count
+            entropy += -count / total * math.log(count / total)
+        scores["rps_doc_mean_word_length"] = round(
+            num_chars / self.num_normalized_words, _PRECISION
+        )
+        if stop_words is not None:
+            scores["rps_doc_stop_word_fraction"] = round(
+                float(num_stop_words) / self.num_normalized_words, _PRECISION
+            )
+        scores["rps_doc_frac_unique_words"] = round(
+            len(counter) / self.num_normalized_words, _PRECISION
+        )
+        scores["rps_doc_unigram_entropy"] = round(entropy, _PRECISION)
+        return scores
+
+    def score(
+        self,
+        sentencepiece_model: Optional[SentencePieceProcessor] = None,
+        kenlm_model: Optional[Model] = None,
+        signals: Optional[Iterable[str]] = None,
+    ):
+        """Computes the signals of the document, sharing the passes over the
+        words and the lines between signals. Signals that are not requested are
+        never computed.
+
+        Parameters
+        ----------
+        sentencepiece_model: sentencepiece.SentencePieceProcessor, optional
+            The **sentencepiece** tokenizer used to encode text for the `kenlm_model`.
+        kenlm_model: kenlm.Model, optional
+            Language model used to compute the perplexity. The perplexity is ``None``
+            without the two models.
+        signals: Iterable[str], optional
+            Names of the signals to compute. Every signal by default.
+
+        Returns
+        -------
+        scores: Dict[str, Any]
+            Value of each signal, with the same value as the method of the same name.
+        """
+        signals = tuple(signals) if signals is not None else _SIGNALS
+        requested = set(signals)
+        scores: Dict[str, Any] = {}
+        if "token_count" in requested:
+            scores["token_count"] = self.count_tokens()
+        if requested.intersection(_RAW_WORDS_SIGNALS):
+            scores.update(self._raw_words_scores())
+        if requested.intersection(_RAW_LINES_SIGNALS):
+            scores.update(self._raw_lines_scores())
+        if requested.intersection(_NORMALIZED_WORDS_SIGNALS):
+            scores.update(self._normalized_words_scores())
+        if "rps_doc_lorem_ipsum" in requested:
+            scores["rps_doc_lorem_ipsum"] = self.rps_doc_lorem_ipsum()
+        if "rps_doc_symbol_to_word_ratio" in requested:
+            scores["rps_doc_symbol_to_word_ratio"] = (
+                self.rps_doc_symbol_to_word_ratio()
+            )
+        if "rps_doc_num_sentences" in requested:
+            scores["rps_doc_num_sentences"] = self.rps_doc_num_sentences()
+        ns = [
+            n
+            for n in _DUPE_NGRAM_SIZES
+            if f"rps_frac_chars_in_dupe_{n}grams" in requested
         ]
-        ngrams_size = len(ngrams)
-        ngrams_count = Counter(ngrams)
-        dedup_size = sum(count for count in ngrams_count.values() if count > 1)
-        score = dedup_size / ngrams_size
-        score = round(score, _PRECISION)
-        return score
+        if ns:
+            for n, score in self.rps_frac_chars_in_dupe_ngrams_multi(ns).items():
+                scores[f"rps_frac_chars_in_dupe_{n}grams"] = score
+        if "kenlm_pp" in requested:
+            if sentencepiece_model is None or kenlm_model is None:
+                scores["kenlm_pp"] = None
+            else:
+                scores["kenlm_pp"] = self.compute_perplexity(
+                    sentencepiece_model, kenlm_model
+                )
+        return {signal: scores[signal] for signal in signals}
+
+    @classmethod
+    def score_batch(
+        cls,
+        texts: List[str],
+        lang: str,
+        tokenizer: Optional[Any] = None,
+        sentencepiece_model: Optional[SentencePieceProcessor] = None,
+        kenlm_model: Optional[Model] = None,
+        signals: Optional[Iterable[str]] = None,
+    ):
+        """Computes the signals of a batch of texts in the same language.
+
+        Parameters
+        ----------
+        texts: List[str]
+            Raw texts of the batch.
+        lang: str
+            ISO-636 language code of the texts.
+        tokenizer: transformers.AutoModel, optional
+            **HuggingFace** tokenizer used to count the tokens.
+        sentencepiece_model: sentencepiece.SentencePieceProcessor, optional
+            The **sentencepiece** tokenizer used to encode text for the `kenlm_model`.
+        kenlm_model: kenlm.Model, optional
+            Language model used to compute the perplexity.
+        signals: Iterable[str], optional
+            Names of the signals to compute. Every signal by default.
+
+        Returns
+        -------
+        columns: Dict[str, List[Any]]
+            The fixed texts under "text", then one column per signal, ready to be
+            assigned to a **HuggingFace** batch.
+
+        Examples
+        --------
+        >>> from halvesting.utils.data import Postprocessing
+        >>> columns = Postprocessing.score_batch(["Lorem Ipsum dolor sit amet,"], "en")
+        >>> columns["rps_doc_frac_all_caps_words"]
+        [0.0]
+        """
+        signals = tuple(signals) if signals is not None else _SIGNALS
+        columns: Dict[str, List[Any]] = {"text": []}
+        columns.update((signal, []) for signal in signals)
+        for text in texts:
+            document = cls(text=text, lang=lang, tokenizer=tokenizer)
+            columns["text"].append(document.raw_content)
+            scores = document.score(sentencepiece_model, kenlm_model, signals)
+            for signal in signals:
+                columns[signal].append(scores[signal])
+        return columns
 
     def compute_perplexity(
         self,
@@ -3,10 +3,39 @@
 import logging
 import re
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
+import lxml.etree
 from lxml.html import HtmlElement
 
+# Precompiled expressions shared by every publication
+_SUFFIX_RE = re.compile(r"(^.+)-(.+$)")
+_SPACES_RE = re.compile(r" +")
+_EXTERNAL_ID_RE = re.compile(r"(^.+)((?<=\/)[^\/]+$)")
+_BIBLFULL_XPATH = lxml.etree.XPath("//text/listbibl/biblfull")
+_PDF_XPATH = lxml.etree.XPath(
+    ".//editionstmt/edition/ref[contains(@subtype, 'author')]"
+)
+_NOT_BEFORE_XPATH = lxml.etree.XPath(".//date/@notbefore")
+_HALID_XPATH = lxml.etree.XPath(".//idno[contains(@type,'halId')]")
+_TITLE_XPATH = lxml.etree.XPath(".//title")
+_AUTHORS_XPATH = lxml.etree.XPath(".//titlestmt/author[contains(@role, 'aut')]")
+_DATE_XPATH = lxml.etree.XPath(
+    """.//editionstmt/edition[contains(@type, 'current')]
+    /date[contains(@type, 'whenProduced')]
+    """
+)
+_LANG_XPATH = lxml.etree.XPath(".//profiledesc/langusage/language/@ident")
+_DOMAIN_XPATH = lxml.etree.XPath(
+    """.//profiledesc/textclass
+    /classcode[contains(@scheme, 'halDomain')]/@n
+    """
+)
+_PERSNAME_XPATH = lxml.etree.XPath(".//persname")
+_AUTHOR_INFO_XPATH = lxml.etree.XPath(".//idno | .//affiliation | .//email")
+_NEXT_CURSOR_RE = re.compile(rb"<TEI\b[^>]*?\snext=\"([^\"]*)\"", re.IGNORECASE)
+_MEASURE_RE = re.compile(rb"<measure\b[^>]*?\squantity=\"(\d+)\"", re.IGNORECASE)
+
 
 def _parse_authors(authors: List[HtmlElement]):
     """Parses the authors into a uniform list of dict.
@@ -25,13 +54,12 @@ def _parse_authors(authors: List[HtmlElement]):
     for author in authors:
         author_ = {}
         author_["affiliations"] = []
-        for name in author.xpath(".//persname"):
-            author_["name"] = re.sub(                                       # Joins all the words constituing the name
-                r" +",
+        for name in _PERSNAME_XPATH(author):
+            author_["name"] = _SPACES_RE.sub(                               # Joins all the words constituing the name
                 r" ",
                 "".join(name.itertext()).strip()
             )
-        for e in author.xpath(".//idno | .//affiliation | .//email"):       # In the idno, affiliation or email balises
+        for e in _AUTHOR_INFO_XPATH(author):                                # In the idno, affiliation or email balises
             attrib = e.attrib
             text = e.text
             if "type" in attrib:
@@ -40,21 +68,16 @@ def _parse_authors(authors: List[HtmlElement]):
                 elif attrib["type"] == "md5":                               # The encrypted email adress
                     author_[attrib["type"].lower()] = text
                 elif attrib["type"] == "halauthorid":                       # Then end of the halauthorid (identified author or not)
-                    author_["halauthorid"] = re.sub(
-                        r"(^.+)-(.+$)",
-                        r"\2",
-                        text
-                    )
+                    author_["halauthorid"] = _SUFFIX_RE.sub(r"\2", text)
                 else:
                     # We only take the unique identifier for external ids (arxiv, viaf, ...)
-                    author_[attrib["type"].lower()] = re.sub(
-                        r"(^.+)((?<=\/)[^\/]+$)",
+                    author_[attrib["type"].lower()] = _EXTERNAL_ID_RE.sub(
                         r"\2",
                         text
                     )
             else:
                 author_["affiliations"].append(
-                    re.sub(r"(^.+)-(.+$)", r"\2", attrib["ref"])
+                    _SUFFIX_RE.sub(r"\2", attrib["ref"])
                 )
         authors_list.append(author_)
     return authors_list
@@ -91,6 +114,79 @@ def extract_year(date_string: str):
     return str(year)
 
 
+def _page_context():
+    """Computes the values shared by every publication of a page.
+
+    Returns
+    -------
+    today: str
+        Current date in the `%Y-%m-%d` format, used to check embargoes.
+    timestamp: str
+        Current time in the `%Y/%m/%d %H:%M:%S` format.
+    """
+    now = datetime.now()
+    return now.strftime("%Y-%m-%d"), now.strftime("%Y/%m/%d %H:%M:%S")
+
+
+def format_biblfull(
+    match: HtmlElement, today: Optional[str] = None, timestamp: Optional[str] = None
+):
+    """Parses a single publication returned by HAL.
+
+    Parameters
+    ----------
+    match : lxml.html.HtmlElement
+        ``biblfull`` node of a publication.
+    today : str, optional
+        Current date in the `%Y-%m-%d` format. Computed if not given.
+    timestamp : str, optional
+        Time of the crawl in the `%Y/%m/%d %H:%M:%S` format. Computed if not given.
+
+    Returns
+    -------
+    parsed_data: Dict[str, Any] | None
+        Formatted publication or ``None`` if it has no open PDF or is missing
+        mandatory metadata.
+    """
+    if today is None or timestamp is None:
+        today, timestamp = _page_context()
+    # Try to find a PDF file submitted
+    pdf = _PDF_XPATH(match)
+
+    # If no file submitted for this publication, pass
+    if len(pdf) == 0:
+        return None
+    # If the submitted file is not a PDF, pass
+    if not pdf[0].attrib["target"].endswith(".pdf"):
+        return None
+    # If the PDF is under embargo (closed access). ISO dates compare as strings.
+    if _NOT_BEFORE_XPATH(pdf[0])[0] > today:
+        return None
+
+    parsed_data = {}
+    try:
+        halid = _HALID_XPATH(match)[0]
+        title = _TITLE_XPATH(match)[0]
+        authors = _AUTHORS_XPATH(match)
+        # The date is the produced year provided by HAL
+        date = _DATE_XPATH(match)[0]
+        lang = _LANG_XPATH(match)[0]
+        domain = _DOMAIN_XPATH(match)
+    except IndexError:
+        return None
+    parsed_data["halid"] = _SUFFIX_RE.sub(r"\2", halid.text)
+    parsed_data["lang"] = lang
+    parsed_data["title"] = title.text
+    parsed_data["domain"] = domain
+    parsed_data["timestamp"] = timestamp
+    parsed_data["year"] = extract_year(date.text)
+    # Sometimes, several PDFs are submitted by a depositor. We assume the
+    # first one being the main publication.
+    parsed_data["url"] = pdf[0].attrib["target"]
+    parsed_data["authors"] = _parse_authors(authors)
+    return parsed_data
+
+
 def format_hal(data: HtmlElement):
     """Parses the XML response from HAL.
 
@@ -105,52 +201,135 @@ def format_hal(data: HtmlElement):
         Formatted data.
     """
     new_data = []
+    today, timestamp = _page_context()
     # For every publication returned
-    for match in data.xpath("//text/listbibl/biblfull"):
-        # Try to find a PDF file submitted
-        pdf = match.xpath(".//editionstmt/edition/ref[contains(@subtype, 'author')]")
-
-        # If no file submitted for this publication, pass
-        if len(pdf) == 0:
-            continue
-        # If the submitted file is not a PDF, pass
-        if not pdf[0].attrib["target"].endswith(".pdf"):
-            continue
-        # If the PDF is under embargo (closed access)
-        if (
-            datetime.strptime(pdf[0].xpath(".//date/@notbefore")[0], "%Y-%m-%d")
-            > datetime.now()
-        ):
-            continue
-
-        parsed_data = {}
-        try:
-            halid = match.xpath(".//idno[contains(@type,'halId')]")[0]
-            title = match.xpath(".//title")[0]
-            authors = match.xpath(".//titlestmt/author[contains(@role, 'aut')]")
-            # The date is the produced year provided by HAL
-            date = match.xpath(
-                """.//editionstmt/edition[contains(@type, 'current')]
-                /date[contains(@type, 'whenProduced')]
-                """
-            )[0]
-            lang = match.xpath(".//profiledesc/langusage/language/@ident")[0]
-            domain = match.xpath(
-                """.//profiledesc/textclass
-                /classcode[contains(@scheme, 'halDomain')]/@n
-                """
-            )
-        except IndexError:
-            continue
-        parsed_data["halid"] = re.sub(r"(^.+)-(.+$)", r"\2", halid.text)
-        parsed_data["lang"] = lang
-        parsed_data["title"] = title.text
-        parsed_data["domain"] = domain
-        parsed_data["timestamp"] = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
-        parsed_data["year"] = extract_year(date.text)
-        # Sometimes, several PDFs are submitted by a depositor. We assume the
-        # first one being the main publication.
-        parsed_data["url"] = pdf[0].attrib["target"]
-        parsed_data["authors"] = _parse_authors(authors)
-        new_data.append(parsed_data)
+    for match in _BIBLFULL_XPATH(data):
+        parsed_data = format_biblfull(match, today, timestamp)
+        if parsed_data is not None:
+            new_data.append(parsed_data)
     return new_data
+
+
+def read_hal_header(data: bytes):
+    """Reads the pagination information of a raw response from HAL without
+    parsing the publications.
+
+    Parameters
+    ----------
+    data : bytes
+        Raw response from HAL.
+
+    Returns
+    -------
+    next_cursor: str | None
+        Cursor of the next page.
+    measures: List[int]
+        Total number of matchs, then number of returned documents.
+    """
+    match = _NEXT_CURSOR_RE.search(data)
+    next_cursor = match.group(1).decode("utf-8") if match is not None else None
+    measures = []
+    for match in _MEASURE_RE.finditer(data):
+        measures.append(int(match.group(1)))
+        if len(measures) == 2:
+            break
+    return next_cursor, measures
+
+
+def format_hal_page(data: bytes):
+    """Parses a raw response from HAL. Meant to be run in a worker process.
+
+    Parameters
+    ----------
+    data : bytes
+        Raw response from HAL.
+
+    Returns
+    -------
+    new_data: List[Dict[str, Any]]
+        Formatted data.
+    """
+    parser = HALStreamParser()
+    new_data = parser.feed(data)
+    new_data.extend(parser.close())
+    return new_data
+
+
+class HALStreamParser:
+    """Incrementally parses a response from HAL fed by chunks of bytes. Each
+    publication is formatted as soon as its ``biblfull`` node is complete, then
+    freed, so that the memory footprint is bounded by a single publication
+    instead of a whole page.
+
+    Notes
+    -----
+    The HTML parser is kept on purpose: the XPath expressions used by
+    ``format_biblfull`` rely on its lowercased and namespace-free tree.
+
+    Attributes
+    ----------
+    next_cursor : str
+        Cursor of the next page, read from the root node.
+    measures : List[int]
+        Quantities found in the ``measure`` nodes: the total number of matchs,
+        then the number of returned documents.
+
+    Examples
+    --------
+    >>> from halvesting.utils.data import HALStreamParser
+    >>> parser = HALStreamParser()
+    >>> records = parser.feed(chunk)
+    >>> records.extend(parser.close())
+    """
+
+    def __init__(self):
+        self._parser = lxml.etree.HTMLPullParser(events=("start", "end"))
+        self._today, self._timestamp = _page_context()
+        self.next_cursor = None
+        self.measures = []
+
+    def feed(self, chunk: bytes):
+        """Feeds a chunk of the response to the parser.
+
+        Parameters
+        ----------
+        chunk : bytes
+            Chunk of the response's body.
+
+        Returns
+        -------
+        records: List[Dict[str, Any]]
+            Publications completed by this chunk.
+        """
+        self._parser.feed(chunk)
+        return self._read_events()
+
+    def close(self):
+        """Terminates the parsing.
+
+        Returns
+        -------
+        records: List[Dict[str, Any]]
+            Remaining publications.
+        """
+        self._parser.close()
+        return self._read_events()
+
+    def _read_events(self):
+        records = []
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if element.tag == "tei" and self.next_cursor is None:
+                    self.next_cursor = element.get("next")
+                continue
+            if element.tag == "measure":
+                self.measures.append(int(element.attrib["quantity"]))
+            elif element.tag == "biblfull":
+                parsed_data = format_biblfull(element, self._today, self._timestamp)
+                if parsed_data is not None:
+                    records.append(parsed_data)
+                # Frees the publication and the ones parsed before it
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+        return records
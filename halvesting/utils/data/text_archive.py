@@ -0,0 +1,161 @@
+# halvesting/utils/data/text_archive.py
+
+import glob
+import os
+import tarfile
+import threading
+import zipfile
+from typing import Dict, List, Optional, Tuple, Union
+
+_TXT_SUFFIX = ".grobid.txt"
+_TAR_SUFFIX = ".tar"
+
+
+def _get_halid(name: str):
+    """Extracts the halid from the name of a text file.
+
+    Parameters
+    ----------
+    name: str
+        Path to a text file, e.g. `txts/02975689.grobid.txt`.
+
+    Returns
+    -------
+    halid: str | None
+        halid of the paper, or ``None`` if the file is not a GROBID text file.
+    """
+    basename = os.path.basename(name)
+    if not basename.endswith(_TXT_SUFFIX):
+        return None
+    return basename[: -len(_TXT_SUFFIX)]
+
+
+class TextArchive:
+    """Gives random access to the full texts extracted by GROBID. The source is
+    opened once and indexed by halid, so that reading a paper never scans the
+    whole source again.
+
+    Parameters
+    ----------
+    path: str
+        Path to the texts: a zip archive, a directory of `{halid}.grobid.txt` files
+        and uncompressed tar shards, nested or not, or a tar file or glob pattern
+        matching several tar files.
+
+    Attributes
+    ----------
+    path: str
+        Path to the texts.
+
+    Notes
+    -----
+    Tar shards must not be compressed: random access into a compressed tar requires
+    decompressing it from the start. ``read`` can be called from several threads.
+
+    Examples
+    --------
+    >>> from halvesting.utils.data import TextArchive
+    >>> with TextArchive("./data/txts.zip") as archive:
+    ...     text = archive.read("02975689")
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._tars: List[tarfile.TarFile] = []
+        self._tar_locks: Dict[tarfile.TarFile, threading.Lock] = {}
+        self._index: Dict[
+            str,
+            Tuple[
+                Optional[Union[zipfile.ZipFile, tarfile.TarFile]],
+                Union[str, zipfile.ZipInfo, tarfile.TarInfo],
+            ],
+        ] = {}
+        if os.path.isdir(path):
+            self._index_dir(path)
+        elif zipfile.is_zipfile(path):
+            self._index_zip(path)
+        else:
+            tar_paths = sorted(glob.glob(path))
+            if not tar_paths:
+                raise FileNotFoundError(f"No texts found at {path}")
+            for tar_path in tar_paths:
+                self._index_tar(tar_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, halid: str):
+        return halid in self._index
+
+    def _index_zip(self, path: str):
+        self._zip = zipfile.ZipFile(path, "r")
+        for info in self._zip.infolist():
+            halid = _get_halid(info.filename)
+            if halid is not None:
+                self._index[halid] = (self._zip, info)
+
+    def _index_tar(self, path: str):
+        tar = tarfile.open(path, "r:")
+        self._tars.append(tar)
+        self._tar_locks[tar] = threading.Lock()
+        for member in tar:
+            halid = _get_halid(member.name)
+            if halid is not None and member.isfile():
+                self._index[halid] = (tar, member)
+        tar.members = []  # The index keeps the members we need
+
+    def _index_dir(self, path: str):
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in sorted(file_names):
+                file_path = os.path.join(dir_path, file_name)
+                if file_name.endswith(_TAR_SUFFIX):
+                    self._index_tar(file_path)
+                    continue
+                halid = _get_halid(file_name)
+                if halid is not None:
+                    self._index[halid] = (None, file_path)
+
+    def read(self, halid: str):
+        """Reads the full text of a paper.
+
+        Parameters
+        ----------
+        halid: str
+            halid of the paper.
+
+        Returns
+        -------
+        text: bytes | None
+            Full text of the paper, or ``None`` if it is not in the archive.
+        """
+        entry = self._index.get(halid)
+        if entry is None:
+            return None
+        source, member = entry
+        if source is None:
+            with open(member, "rb") as f:  # type: ignore
+                return f.read()
+        if isinstance(source, zipfile.ZipFile):
+            return source.read(member)  # type: ignore
+        # Members of a tar share the same file object
+        with self._tar_locks[source]:  # type: ignore
+            f = source.extractfile(member)  # type: ignore
+            return f.read() if f is not None else None
+
+    def close(self):
+        """Closes the underlying archives."""
+        if self._zip is not None:
+            self._zip.close()
+        for tar in self._tars:
+            tar.close()
+        self._zip = None
+        self._tars = []
+        self._tar_locks = {}
+        self._index = {}
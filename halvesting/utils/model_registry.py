@@ -0,0 +1,81 @@
+# halvesting/utils/model_registry.py
+
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from halvesting.utils.helper import load_kenlm_model, load_sentencepiece_model
+
+_TOKENIZERS: Dict[Tuple[str, bool], Any] = {}
+_SENTENCEPIECE_MODELS: Dict[str, Any] = {}
+_KENLM_MODELS: Dict[str, Any] = {}
+
+
+def get_tokenizer(checkpoint: str = "google/mt5-base", use_fast: Optional[bool] = None):
+    """Loads a **HuggingFace** tokenizer once per process.
+
+    Parameters
+    ----------
+    checkpoint: str, default="google/mt5-base"
+        Name of the tokenizer on the **HuggingFace** hub, or path to a local
+        checkpoint.
+    use_fast: bool, optional
+        Set to ``True`` to use the Rust-based tokenizer. The slow one is used by
+        default.
+
+    Returns
+    -------
+    tokenizer: transformers.PreTrainedTokenizer
+        Tokenizer shared by every caller of the process.
+    """
+    use_fast = bool(use_fast)
+    key = (checkpoint, use_fast)
+    if key not in _TOKENIZERS:
+        # Imported here so that the other stages do not pay for importing transformers
+        from transformers import AutoTokenizer
+
+        logging.info(f"Loading tokenizer {checkpoint}...")
+        _TOKENIZERS[key] = AutoTokenizer.from_pretrained(checkpoint, use_fast=use_fast)
+    return _TOKENIZERS[key]
+
+
+def get_sentencepiece_model(path: str):
+    """Loads a **sentencepiece** model once per process.
+
+    Parameters
+    ----------
+    path: str
+        Path to the sentencepiece model file.
+
+    Returns
+    -------
+    sentencepiece_model: sentencepiece.SentencePieceProcessor | None
+        Model shared by every caller of the process, or ``None`` if loading failed.
+    """
+    if path not in _SENTENCEPIECE_MODELS:
+        _SENTENCEPIECE_MODELS[path] = load_sentencepiece_model(path)
+    return _SENTENCEPIECE_MODELS[path]
+
+
+def get_kenlm_model(path: str):
+    """Loads a **KenLM** model once per process.
+
+    Parameters
+    ----------
+    path: str
+        Path to the KenLM model file.
+
+    Returns
+    -------
+    kenlm_model: kenlm.Model | None
+        Model shared by every caller of the process, or ``None`` if loading failed.
+    """
+    if path not in _KENLM_MODELS:
+        _KENLM_MODELS[path] = load_kenlm_model(path)
+    return _KENLM_MODELS[path]
+
+
+def clear_models():
+    """Releases the sentencepiece and KenLM models of the process, e.g. once a
+    language is done. Tokenizers are kept as they are shared by every language."""
+    _SENTENCEPIECE_MODELS.clear()
+    _KENLM_MODELS.clear()
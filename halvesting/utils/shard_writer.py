@@ -0,0 +1,662 @@
+# halvesting/utils/shard_writer.py
+
+import gzip
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+_BUFFER_SIZE = 2**20
+_CHECKSUM_FILE = "checksum.sha256"
+
+
+def _dumps(record: Dict[str, Any]):
+    """Serializes a record to a JSON line, with **orjson** if it is installed.
+
+    Parameters
+    ----------
+    record: Dict[str, Any]
+        Record to serialize.
+
+    Returns
+    -------
+    line: bytes
+        UTF-8 encoded JSON object followed by a new line.
+    """
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _complete(dir_path: str, path: str, raw: "_HashingFile"):
+    """Renames a complete shard and appends its checksum to `checksum.sha256`
+    with a single write.
+
+    Parameters
+    ----------
+    dir_path: str
+        Directory containing the shards.
+    path: str
+        Final path to the shard, written at `{path}.tmp`.
+    raw: _HashingFile
+        Closed file the shard was written to.
+    """
+    os.replace(f"{path}.tmp", path)
+    line = f"{raw.hexdigest()}\t{os.path.basename(path)}\n"
+    fd = os.open(
+        os.path.join(dir_path, _CHECKSUM_FILE),
+        os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+        0o644,
+    )
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+class _HashingFile:
+    """File object computing the sha256 checksum and the size of the bytes
+    written to it.
+
+    Parameters
+    ----------
+    path: str
+        Path to the file.
+    """
+
+    def __init__(self, path: str):
+        self.name = path
+        self.mode = "wb"
+        self.num_bytes = 0
+        self._file = open(path, "wb")
+        self._hasher = hashlib.sha256()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def write(self, data: bytes):
+        self._hasher.update(data)
+        self.num_bytes += len(data)
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def tell(self):
+        return self.num_bytes
+
+    def hexdigest(self):
+        return self._hasher.hexdigest()
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class ShardWriter:
+    """Streams records to compressed JSON lines shards, named
+    `{prefix}-{counter}.jsonl.gz` (or `.jsonl.zst`). The sha256 checksum of each
+    shard is computed while it is written and appended to `checksum.sha256` once
+    the shard is complete.
+
+    Parameters
+    ----------
+    dir_path: str
+        Directory containing the shards.
+    prefix: str
+        Beginning of the name of each shard, e.g. `en1.0`.
+    compression: str, default="gzip"
+        Either "gzip" or "zstd". The latter requires **zstandard**.
+    max_records: int, optional
+        Maximum number of records in a shard before starting a new one.
+    max_bytes: int, optional
+        Maximum size in bytes of a compressed shard before starting a new one. Records
+        are compressed by blocks of 1 MiB, so a shard can slightly exceed it.
+    counter: int, default=0
+        Index of the first shard.
+    compresslevel: int, optional
+        Compression level. Defaults to the level of the compression library.
+
+    Attributes
+    ----------
+    dir_path: str
+        Directory containing the shards.
+    prefix: str
+        Beginning of the name of each shard.
+    counter: int
+        Index of the next shard.
+    num_records: int
+        Number of records in the shard being written.
+
+    Notes
+    -----
+    Shards are written with a `.tmp` suffix and renamed once complete, then their
+    checksum is appended with a single write so that concurrent writers never
+    interleave their lines.
+
+    Examples
+    --------
+    >>> from halvesting.utils import ShardWriter
+    >>> with ShardWriter("./data/hf/en", "en1.0", max_records=10000) as writer:
+    ...     writer.write({"halid": "02975689", "text": "..."})
+    """
+
+    def __init__(
+        self,
+        dir_path: str,
+        prefix: str,
+        compression: str = "gzip",
+        max_records: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        counter: int = 0,
+        compresslevel: Optional[int] = None,
+    ):
+        if compression not in _EXTENSIONS:
+            raise ValueError(
+                f"``compression`` expected 'gzip' or 'zstd' but got {compression}"
+            )
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("Writing zstd shards requires `pip install zstandard`.")
+        self.dir_path = dir_path
+        self.prefix = prefix
+        self.compression = compression
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.counter = counter
+        self.compresslevel = compresslevel
+        self.num_records = 0
+        self._path = None
+        self._raw = None
+        self._file = None
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    @property
+    def path(self):
+        """Path to the shard being written."""
+        return os.path.join(
+            self.dir_path,
+            f"{self.prefix}-{self.counter}.jsonl{_EXTENSIONS[self.compression]}",
+        )
+
+    def _open(self):
+        self._path = self.path
+        self._raw = _HashingFile(f"{self._path}.tmp")
+        if self.compression == "gzip":
+            self._file = gzip.GzipFile(
+                filename=os.path.basename(self._path)[: -len(".gz")],
+                mode="wb",
+                compresslevel=(
+                    self.compresslevel if self.compresslevel is not None else 9
+                ),
+                fileobj=self._raw,  # type: ignore
+            )
+        else:
+            compressor = zstandard.ZstdCompressor(  # type: ignore
+                level=self.compresslevel if self.compresslevel is not None else 3
+            )
+            self._file = compressor.stream_writer(self._raw, closefd=False)
+
+    def _flush_buffer(self):
+        self._file.write(bytes(self._buffer))  # type: ignore
+        self._buffer.clear()
+
+    def write(self, record: Dict[str, Any]):
+        """Writes a record, then starts a new shard if the current one is full.
+
+        Parameters
+        ----------
+        record: Dict[str, Any]
+            Record serialized in JSON.
+        """
+        self.write_line(_dumps(record))
+
+    def write_records(self, records: List[Dict[str, Any]]):
+        """Writes a batch of records, starting new shards as needed.
+
+        Parameters
+        ----------
+        records: List[Dict[str, Any]]
+            Records serialized in JSON.
+        """
+        self.write_lines([_dumps(record) for record in records])
+
+    def write_line(self, line: bytes):
+        """Writes an already serialized record, ending with a new line.
+
+        Parameters
+        ----------
+        line: bytes
+            Serialized record.
+        """
+        if self._file is None:
+            self._open()
+        self._buffer += line
+        self.num_records += 1
+        if len(self._buffer) >= _BUFFER_SIZE:
+            self._flush_buffer()
+        if self.max_records is not None and self.num_records >= self.max_records:
+            self.flush()
+        elif self.max_bytes is not None and self._raw.num_bytes >= self.max_bytes:
+            self.flush()
+
+    def write_lines(self, lines: List[bytes]):
+        """Writes a batch of already serialized records, starting new shards
+        as needed.
+
+        Parameters
+        ----------
+        lines: List[bytes]
+            Serialized records, each ending with a new line.
+        """
+        start = 0
+        while start < len(lines):
+            if self._file is None:
+                self._open()
+            stop = len(lines)
+            if self.max_records is not None:
+                stop = min(stop, start + self.max_records - self.num_records)
+            self._buffer += b"".join(lines[start:stop])
+            self.num_records += stop - start
+            start = stop
+            if len(self._buffer) >= _BUFFER_SIZE:
+                self._flush_buffer()
+            if self.max_records is not None and self.num_records >= self.max_records:
+                self.flush()
+            elif self.max_bytes is not None and self._raw.num_bytes >= self.max_bytes:
+                self.flush()
+
+    def flush(self):
+        """Completes the shard being written, if any, and records its
+        checksum."""
+        if self._file is None:
+            return
+        self._flush_buffer()
+        self._file.close()  # Writes the trailer of the compressed stream
+        self._raw.close()  # type: ignore
+        _complete(self.dir_path, self._path, self._raw)  # type: ignore
+        self._path = None
+        self._raw = None
+        self._file = None
+        self.num_records = 0
+        self.counter += 1
+
+    def close(self):
+        """Completes the last shard."""
+        self.flush()
+
+
+class ParquetShardWriter:
+    """Writes records to zstd-compressed Parquet shards, named
+    `{prefix}-{counter}.parquet`, with the same rotation and checksums as
+    ``ShardWriter``.
+
+    Parameters
+    ----------
+    dir_path: str
+        Directory containing the shards.
+    prefix: str
+        Beginning of the name of each shard, e.g. `en1.0`.
+    schema: pyarrow.Schema, optional
+        Schema of every shard. Inferred from the first row group if not given, then
+        kept for the following shards.
+    max_records: int, optional
+        Maximum number of records in a shard before starting a new one.
+    row_group_size: int, default=1000
+        Number of records in a row group. Larger row groups compress better, but are
+        kept in memory until written.
+    counter: int, default=0
+        Index of the first shard.
+    compresslevel: int, optional
+        zstd compression level. Defaults to the level of **pyarrow**.
+
+    Attributes
+    ----------
+    dir_path: str
+        Directory containing the shards.
+    prefix: str
+        Beginning of the name of each shard.
+    schema: pyarrow.Schema | None
+        Schema of the shards.
+    counter: int
+        Index of the next shard.
+    num_records: int
+        Number of records in the shard being written.
+
+    Notes
+    -----
+    Fields missing from a record are null, and fields missing from ``schema`` are
+    dropped, so that every shard can be read as a single dataset.
+
+    Examples
+    --------
+    >>> from halvesting.utils import ParquetShardWriter
+    >>> with ParquetShardWriter("./data/hf/en", "en1.0", max_records=10000) as writer:
+    ...     writer.write({"halid": "02975689", "text": "..."})
+    """
+
+    def __init__(
+        self,
+        dir_path: str,
+        prefix: str,
+        schema: Optional["pa.Schema"] = None,
+        max_records: Optional[int] = None,
+        row_group_size: int = 1000,
+        counter: int = 0,
+        compresslevel: Optional[int] = None,
+    ):
+        if pq is None:
+            raise ImportError("Writing Parquet shards requires `pip install pyarrow`.")
+        self.dir_path = dir_path
+        self.prefix = prefix
+        self.schema = schema
+        self.max_records = max_records
+        self.row_group_size = row_group_size
+        self.counter = counter
+        self.compresslevel = compresslevel
+        self.num_records = 0
+        self._path = None
+        self._raw = None
+        self._writer = None
+        self._rows: List[Dict[str, Any]] = []
+        self._tables: List["pa.Table"] = []
+        self._num_pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    @property
+    def path(self):
+        """Path to the shard being written."""
+        return os.path.join(self.dir_path, f"{self.prefix}-{self.counter}.parquet")
+
+    def _write_row_group(self):
+        """Writes the pending records as a single row group."""
+        if self._rows:
+            self._tables.append(pa.Table.from_pylist(self._rows, schema=self.schema))
+            self._rows = []
+        if not self._tables:
+            return
+        if self.schema is None:
+            self.schema = self._tables[0].schema
+        table = pa.concat_tables(
+            [
+                table if table.schema.equals(self.schema) else table.cast(self.schema)
+                for table in self._tables
+            ]
+        )
+        self._tables = []
+        self._num_pending = 0
+        if self._writer is None:
+            self._path = self.path
+            self._raw = _HashingFile(f"{self._path}.tmp")
+            self._writer = pq.ParquetWriter(
+                self._raw,
+                self.schema,
+                compression="zstd",
+                compression_level=self.compresslevel,
+            )
+        self._writer.write_table(table, row_group_size=table.num_rows)
+
+    def _added(self, num_records: int):
+        self.num_records += num_records
+        self._num_pending += num_records
+        if self._num_pending >= self.row_group_size:
+            self._write_row_group()
+        if self.max_records is not None and self.num_records >= self.max_records:
+            self.flush()
+
+    def write(self, record: Dict[str, Any]):
+        """Writes a record, then starts a new shard if the current one is full.
+
+        Parameters
+        ----------
+        record: Dict[str, Any]
+            Record.
+        """
+        self._rows.append(record)
+        self._added(1)
+
+    def write_records(self, records: List[Dict[str, Any]]):
+        """Writes a batch of records, starting new row groups and shards as
+        needed.
+
+        Parameters
+        ----------
+        records: List[Dict[str, Any]]
+            Records.
+        """
+        for record in records:
+            self.write(record)
+
+    def write_table(self, table: "pa.Table"):
+        """Writes a table of records, starting new row groups and shards as
+        needed.
+
+        Parameters
+        ----------
+        table: pyarrow.Table
+            Records.
+        """
+        start = 0
+        while start < table.num_rows:
+            stop = min(table.num_rows, start + self.row_group_size - self._num_pending)
+            if self.max_records is not None:
+                stop = min(stop, start + self.max_records - self.num_records)
+            if self._rows:  # Keeps the order of the records
+                self._tables.append(
+                    pa.Table.from_pylist(self._rows, schema=self.schema)
+                )
+                self._rows = []
+            self._tables.append(table.slice(start, stop - start))
+            self._added(stop - start)
+            start = stop
+
+    def flush(self):
+        """Completes the shard being written, if any, and records its
+        checksum."""
+        self._write_row_group()
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._raw.close()  # type: ignore
+        _complete(self.dir_path, self._path, self._raw)  # type: ignore
+        self._path = None
+        self._raw = None
+        self._writer = None
+        self.num_records = 0
+        self.counter += 1
+
+    def close(self):
+        """Completes the last shard."""
+        self.flush()
+
+
+def _export_range(
+    dataset: Any,
+    dir_path: str,
+    prefix: str,
+    counter: int,
+    max_records: Optional[int],
+    batch_size: int,
+    compression: str,
+    output_format: str = "jsonl",
+    row_group_size: int = 1000,
+):
+    """Writes a dataset to shards, starting at shard ``counter``. Meant to be
+    run in a worker process.
+
+    Parameters
+    ----------
+    dataset: datasets.Dataset
+        Rows to export.
+    dir_path: str
+        Directory containing the shards.
+    prefix: str
+        Beginning of the name of each shard.
+    counter: int
+        Index of the first shard.
+    max_records: int, optional
+        Maximum number of records in a shard.
+    batch_size: int
+        Number of rows read at once.
+    compression: str
+        Either "gzip" or "zstd".
+    output_format: str, default="jsonl"
+        Either "jsonl" or "parquet".
+    row_group_size: int, default=1000
+        Number of records in a Parquet row group.
+
+    Returns
+    -------
+    num_records: int
+        Number of records written.
+    """
+    if output_format == "parquet":
+        with ParquetShardWriter(
+            dir_path,
+            prefix,
+            schema=dataset.features.arrow_schema,
+            max_records=max_records,
+            row_group_size=row_group_size,
+            counter=counter,
+        ) as writer:
+            for table in dataset.with_format("arrow").iter(batch_size=batch_size):
+                writer.write_table(table)
+        return len(dataset)
+
+    num_records = 0
+    with ShardWriter(
+        dir_path,
+        prefix,
+        compression=compression,
+        max_records=max_records,
+        counter=counter,
+    ) as writer:
+        for batch in dataset.iter(batch_size=batch_size):
+            columns = list(batch.keys())
+            lines = [
+                _dumps(dict(zip(columns, values))) for values in zip(*batch.values())
+            ]
+            writer.write_lines(lines)
+            num_records += len(lines)
+    return num_records
+
+
+def export_dataset(
+    dataset: Any,
+    dir_path: str,
+    prefix: str,
+    max_records: Optional[int] = None,
+    batch_size: int = 1000,
+    compression: str = "gzip",
+    num_proc: Optional[int] = None,
+    output_format: str = "jsonl",
+    row_group_size: int = 1000,
+):
+    """Exports a **HuggingFace** dataset to compressed JSON lines or Parquet
+    shards. Rows are read by batches of Arrow records. JSON lines are serialized
+    with **orjson** if it is installed, while Parquet shards are written straight
+    from the Arrow batches with the schema of the dataset.
+
+    Parameters
+    ----------
+    dataset: datasets.Dataset
+        Dataset to export.
+    dir_path: str
+        Directory containing the shards.
+    prefix: str
+        Beginning of the name of each shard, e.g. `en1.0`.
+    max_records: int, optional
+        Maximum number of records in a shard.
+    batch_size: int, default=1000
+        Number of rows read at once.
+    compression: str, default="gzip"
+        Either "gzip" or "zstd". Parquet shards are always compressed with zstd.
+    num_proc: int, optional
+        Number of processes writing the shards. Each process writes a contiguous
+        range of whole shards, so the output does not depend on ``num_proc``.
+        Requires ``max_records``.
+    output_format: str, default="jsonl"
+        Either "jsonl" or "parquet".
+    row_group_size: int, default=1000
+        Number of records in a Parquet row group.
+
+    Returns
+    -------
+    num_records: int
+        Number of records written.
+
+    Examples
+    --------
+    >>> from halvesting.utils import export_dataset
+    >>> export_dataset(dataset, "./data/hf/en", "en1.0", max_records=10000)
+    """
+    if output_format not in ("jsonl", "parquet"):
+        raise ValueError(
+            f"``output_format`` expected 'jsonl' or 'parquet' but got {output_format}"
+        )
+    num_rows = len(dataset)
+    if num_proc is None or num_proc <= 1 or max_records is None:
+        return _export_range(
+            dataset,
+            dir_path,
+            prefix,
+            0,
+            max_records,
+            batch_size,
+            compression,
+            output_format,
+            row_group_size,
+        )
+
+    num_shards = math.ceil(num_rows / max_records)
+    shards_per_proc = math.ceil(num_shards / num_proc)
+    with ProcessPoolExecutor(num_proc) as executor:
+        futures = []
+        for counter in range(0, num_shards, shards_per_proc):
+            start = counter * max_records
+            stop = min(num_rows, (counter + shards_per_proc) * max_records)
+            futures.append(
+                executor.submit(
+                    _export_range,
+                    dataset.select(range(start, stop)),
+                    dir_path,
+                    prefix,
+                    counter,
+                    max_records,
+                    batch_size,
+                    compression,
+                    output_format,
+                    row_group_size,
+                )
+            )
+        return sum(future.result() for future in futures)
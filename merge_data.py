@@ -19,5 +19,10 @@ if __name__ == "__main__":
         txts_dir_path=args.txts_dir_path,
         output_dir_path=args.output_dir_path,
         version=args.version,
+        num_workers=args.num_workers,
+        num_compressors=args.num_compressors,
+        compression=args.compression,
+        output_format=args.output_format,
+        row_group_size=args.row_group_size,
     )
     merger()
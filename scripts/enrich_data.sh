@@ -16,6 +16,10 @@ BATCH_SIZE=1000
 
 OUTPUT_DIR_PATH="$DATA_ROOT/$DATASET_CHECKPOINT"
 VERSION="1.0"
+COMPRESSION="gzip"          # gzip or zstd
+OUTPUT_FORMAT="jsonl"       # jsonl or parquet
+ROW_GROUP_SIZE=1000
+SIGNALS=( all )             # all, filter or names of signals
 
 # -------------------------------- Optional Arguments ----------------------------------
 
@@ -39,6 +43,10 @@ cmd=( python3 "$PROJECT_ROOT/enrich_data.py" \
   --batch_size "$BATCH_SIZE" \
   --output_dir_path "${OUTPUT_DIR_PATH:-$DATA_ROOT/$DATASET_CHECKPOINT}" \
   --version "$VERSION" \
+  --compression "$COMPRESSION" \
+  --output_format "$OUTPUT_FORMAT" \
+  --row_group_size "$ROW_GROUP_SIZE" \
+  --signals "${SIGNALS[@]}" \
   --load_from_cache_file "${LOAD_FROM_CACHE_FILE:-false}" )
 
 if [[ -v CACHE_DIR_PATH ]]; then
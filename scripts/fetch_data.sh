@@ -13,10 +13,33 @@ FROM_DATE="2024-02-01"
 FROM_HOUR="00:00:00"
 TO_DATE="2024-05-31"
 TO_HOUR="23:59:59"
+NUM_SLICES=1                # Opt-in: more than 1 needs FROM_DATE and TO_DATE
+MAX_CONCURRENCY=4
+RESUME=false                # Set to true to restart from the last checkpoint
+NUM_PARSERS=0               # Opt-in: worker processes parsing the responses
+PARSE_WINDOW=8
+QUEUE_SIZE=16
+OUTPUT_FORMAT="json"        # json or jsonl
+COMPRESS_OUTPUT=false       # Only for jsonl
+# MAX_FILE_BYTES=268435456  # Only for jsonl
+# RUN_ID="crawl-0"          # Random by default, needed to resume a given run
+MAX_RETRIES=5               # Retries of a request to HAL or to a PDF
+# API_RATE_LIMIT=10         # Requests per second sent to HAL
 
 PDF=false
 PDF_DIR="$DATA_ROOT/pdfs"   # Mandatory if PDF is true
 NUM_CHUNKS=100              # mandatory if PDF is true
+LIMIT_PER_HOST=0            # 0 means no limit
+KEEP_ALIVE=true
+# CONNECT_TIMEOUT=30
+# READ_TIMEOUT=60
+# MAX_PDF_SIZE=536870912
+INCREMENTAL=false           # Opt-in: skip the PDFs already downloaded
+REVALIDATE=false            # Re-download the PDFs that changed on HAL
+# PDF_RATE_LIMIT=10         # Requests per second sent to a host of PDFs
+SHARD_LAYOUT="flat"         # Opt-in: prefix or hash, for new directories only
+SHARD_DEPTH=2               # With prefix: pdfs/02/97/02975689.pdf
+NUM_WRITERS=4
 # --------------------------------------------------------------------------------------
 
 # **************************************************************************************
@@ -40,8 +63,77 @@ fi
 if [[ -v TO_HOUR ]]; then
   cmd+=( --to_hour "$TO_HOUR" )
 fi
+if [[ -v NUM_SLICES ]]; then
+  cmd+=( --num_slices "$NUM_SLICES" )
+fi
+if [[ -v MAX_CONCURRENCY ]]; then
+  cmd+=( --max_concurrency "$MAX_CONCURRENCY" )
+fi
+if [[ -v RESUME ]]; then
+  cmd+=( --resume "$RESUME" )
+fi
+if [[ -v NUM_PARSERS ]]; then
+  cmd+=( --num_parsers "$NUM_PARSERS" )
+fi
+if [[ -v PARSE_WINDOW ]]; then
+  cmd+=( --parse_window "$PARSE_WINDOW" )
+fi
+if [[ -v QUEUE_SIZE ]]; then
+  cmd+=( --queue_size "$QUEUE_SIZE" )
+fi
+if [[ -v OUTPUT_FORMAT ]]; then
+  cmd+=( --output_format "$OUTPUT_FORMAT" )
+fi
+if [[ -v COMPRESS_OUTPUT ]]; then
+  cmd+=( --compress_output "$COMPRESS_OUTPUT" )
+fi
+if [[ -v MAX_FILE_BYTES ]]; then
+  cmd+=( --max_file_bytes "$MAX_FILE_BYTES" )
+fi
+if [[ -v RUN_ID ]]; then
+  cmd+=( --run_id "$RUN_ID" )
+fi
+if [[ -v MAX_RETRIES ]]; then
+  cmd+=( --max_retries "$MAX_RETRIES" )
+fi
+if [[ -v API_RATE_LIMIT ]]; then
+  cmd+=( --api_rate_limit "$API_RATE_LIMIT" )
+fi
 cmd+=( --pdf "$PDF" \
     --pdf_dir "$PDF_DIR" \
     --num_chunks "$NUM_CHUNKS" )
+if [[ -v LIMIT_PER_HOST ]]; then
+  cmd+=( --limit_per_host "$LIMIT_PER_HOST" )
+fi
+if [[ -v KEEP_ALIVE ]]; then
+  cmd+=( --keep_alive "$KEEP_ALIVE" )
+fi
+if [[ -v CONNECT_TIMEOUT ]]; then
+  cmd+=( --connect_timeout "$CONNECT_TIMEOUT" )
+fi
+if [[ -v READ_TIMEOUT ]]; then
+  cmd+=( --read_timeout "$READ_TIMEOUT" )
+fi
+if [[ -v MAX_PDF_SIZE ]]; then
+  cmd+=( --max_pdf_size "$MAX_PDF_SIZE" )
+fi
+if [[ -v INCREMENTAL ]]; then
+  cmd+=( --incremental "$INCREMENTAL" )
+fi
+if [[ -v REVALIDATE ]]; then
+  cmd+=( --revalidate "$REVALIDATE" )
+fi
+if [[ -v PDF_RATE_LIMIT ]]; then
+  cmd+=( --pdf_rate_limit "$PDF_RATE_LIMIT" )
+fi
+if [[ -v SHARD_LAYOUT ]]; then
+  cmd+=( --shard_layout "$SHARD_LAYOUT" )
+fi
+if [[ -v SHARD_DEPTH ]]; then
+  cmd+=( --shard_depth "$SHARD_DEPTH" )
+fi
+if [[ -v NUM_WRITERS ]]; then
+  cmd+=( --num_writers "$NUM_WRITERS" )
+fi
 
 "${cmd[@]}"
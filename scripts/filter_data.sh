@@ -13,6 +13,9 @@ BATCH_SIZE=1000
 
 OUTPUT_DIR_PATH="$DATA_ROOT/Madjakul/HALvest"
 VERSION="1.0"
+COMPRESSION="gzip"          # gzip or zstd
+OUTPUT_FORMAT="jsonl"       # jsonl or parquet
+ROW_GROUP_SIZE=1000
 
 # -------------------------------- Optional Arguments ----------------------------------
 
@@ -32,6 +35,9 @@ cmd=( python3 "$PROJECT_ROOT/filter_data.py" \
   --batch_size "$BATCH_SIZE" \
   --output_dir_path "${OUTPUT_DIR_PATH:-$DATA_ROOT/$DATASET_CHECKPOINT}" \
   --version "$VERSION" \
+  --compression "$COMPRESSION" \
+  --output_format "$OUTPUT_FORMAT" \
+  --row_group_size "$ROW_GROUP_SIZE" \
   --load_from_cache_file "${LOAD_FROM_CACHE_FILE:-false}" )
 
 if [[ -v CACHE_DIR_PATH ]]; then
@@ -6,9 +6,14 @@ DATA_ROOT=$PROJECT_ROOT/data                        # Do not modify
 # ************************** Customizable Arguments ***************************
 
 JS_DIR_PATH="responses_0"
-TXTS_DIR_PATH="txts.zip"
+TXTS_DIR_PATH="txts.zip"          # Also a folder or tar shards, e.g. "txts/*.tar"
 OUTPUT_DIR_PATH="hf"
 VERSION="1.0"
+NUM_WORKERS=4
+NUM_COMPRESSORS=2
+COMPRESSION="gzip"          # gzip or zstd
+OUTPUT_FORMAT="jsonl"       # jsonl or parquet
+ROW_GROUP_SIZE=1000
 
 # *****************************************************************************
 
@@ -17,5 +22,10 @@ cmd=( python3 "$PROJECT_ROOT/merge_data.py" \
   --js_dir_path "$DATA_ROOT/$JS_DIR_PATH" \
   --txts_dir_path "$DATA_ROOT/$TXTS_DIR_PATH" \
   --output_dir_path "$DATA_ROOT/$OUTPUT_DIR_PATH" \
-  --version "$VERSION" )
+  --version "$VERSION" \
+  --num_workers "$NUM_WORKERS" \
+  --num_compressors "$NUM_COMPRESSORS" \
+  --compression "$COMPRESSION" \
+  --output_format "$OUTPUT_FORMAT" \
+  --row_group_size "$ROW_GROUP_SIZE" )
 "${cmd[@]}"
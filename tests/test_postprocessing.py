@@ -0,0 +1,103 @@
+# tests/test_postprocessing.py
+
+from collections import Counter
+
+import pytest
+
+from halvesting.utils.data.postprocessing import (_PRECISION, Postprocessing,
+                                                  _count_dupe_ngrams)
+
+_NS = range(5, 11)
+_TEXTS = (
+    "",
+    "a",
+    "abcd",
+    "aaaaaaaaaa",
+    "abababababababab",
+    "Lorem ipsum dolor sit amet, lorem ipsum dolor sit amet.",
+    "L'été dernier, l'élève a étudié l'été à Orléans. Été, élève, étude.",
+    "Café café CAFÉ café naïve naïve façade façade",
+    "自然言語処理 自然言語処理 は 自然言語処理 の 研究 です 研究 です",
+    "🚀 launch 🚀 launch 🌍🌍🌍 hello 🌍 hello 👩‍🔬 👩‍🔬 science science",
+    "lone \ud800 surrogate \ud800 lone \udfff surrogate \udfff lone lone",
+    "x y z 1 2 3 4 5 6 7 8 9 10 11 12 13 14 15 x y z 1 2 3 4 5 6 7",
+    "one two three four five six seven eight nine ten eleven twelve",
+)
+
+
+def _reference_dupe_ngrams(text: str, n: int):
+    """Counter based implementation used before the n-gram identifiers."""
+    ngrams = [text[i : i + n] for i in range(len(text) - n + 1)]
+    ngrams_count = Counter(ngrams)
+    return sum(count for count in ngrams_count.values() if count > 1)
+
+
+def _reference_score(document: Postprocessing, n: int):
+    if document.num_normalized_words < n:
+        return 0.0
+    ngrams_size = len(document.normalized_content) - n + 1
+    dedup_size = _reference_dupe_ngrams(document.normalized_content, n)
+    return round(dedup_size / ngrams_size, _PRECISION)
+
+
+@pytest.mark.parametrize("text", _TEXTS)
+def test_count_dupe_ngrams_matches_counter(text):
+    ns = [n for n in _NS if n <= len(text)]
+    dupes = _count_dupe_ngrams(text, ns)
+    assert dupes == {n: _reference_dupe_ngrams(text, n) for n in ns}
+
+
+@pytest.mark.parametrize(
+    "text,n", [(text, n) for text in _TEXTS for n in _NS if n <= len(text)]
+)
+def test_count_dupe_ngrams_single_size(text, n):
+    assert _count_dupe_ngrams(text, (n,)) == {n: _reference_dupe_ngrams(text, n)}
+
+
+def test_count_dupe_ngrams_without_sizes():
+    assert _count_dupe_ngrams("abcabcabc", ()) == {}
+
+
+@pytest.mark.parametrize("text", _TEXTS)
+def test_frac_chars_in_dupe_ngrams_multi_matches_counter(text):
+    document = Postprocessing(text=text, lang="en")
+    scores = document.rps_frac_chars_in_dupe_ngrams_multi(_NS)
+    assert scores == {n: _reference_score(document, n) for n in _NS}
+
+
+@pytest.mark.parametrize("n", _NS)
+@pytest.mark.parametrize("text", _TEXTS)
+def test_frac_chars_in_dupe_ngrams_matches_counter(text, n):
+    document = Postprocessing(text=text, lang="en")
+    assert document.rps_frac_chars_in_dupe_ngrams(n) == _reference_score(document, n)
+
+
+def test_frac_chars_in_dupe_ngrams_fewer_words_than_n():
+    document = Postprocessing(text="aaaa aaaa aaaa aaaa", lang="en")
+    assert document.num_normalized_words < 5
+    assert document.rps_frac_chars_in_dupe_ngrams_multi(_NS) == dict.fromkeys(
+        _NS, 0.0
+    )
+
+
+class _WhitespaceTokenizer:
+    def encode(self, text: str, add_special_tokens: bool = True):
+        return text.split()
+
+
+def test_score_without_normalized_signals_skips_normalization():
+    text = "Lorem Ipsum dolor sit amet.\n- consectetur adipiscing elit..."
+    document = Postprocessing(text=text, lang="en", tokenizer=_WhitespaceTokenizer())
+    signals = (
+        "token_count",
+        "rps_doc_frac_all_caps_words",
+        "rps_doc_frac_no_alph_words",
+        "rps_doc_frac_lines_end_with_ellipsis",
+        "rps_lines_frac_start_with_bulletpoint",
+        "rps_doc_num_sentences",
+    )
+    scores = document.score(signals=signals)
+    assert tuple(scores) == signals
+    assert scores["token_count"] == 9
+    assert document._normalized_content is None
+    assert document._normalized_words is None